@@ -21,6 +21,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework.authtoken',
     'rest_framework',
     'django_filters',
@@ -32,6 +33,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'recipe.metrics.MetricsMiddleware',
+    'recipe.compression.CompressionMiddleware',
+    'recipe.replicas.ReplicaMiddleware',
+    'recipe.async_views.AsyncViewsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -78,9 +83,78 @@ DATABASES = {
         "PASSWORD": os.getenv("POSTGRES_PASSWORD", "mysecretpassword"),
         'HOST': os.getenv('DB_HOST', 'db'),
         "PORT": os.getenv("DB_PORT", 5432),
+        # Постоянные соединения с проверкой перед повторным использованием.
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Реплики только для чтения: хосты через пробел, порт через двоеточие.
+for number, replica in enumerate(os.getenv('DB_REPLICAS', '').split(), 1):
+    replica_host, _, replica_port = replica.partition(':')
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'HOST': replica_host,
+        'PORT': replica_port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['recipe.replicas.ReplicaRouter']
+
+# После изменяющего запроса клиент столько секунд читает из основной базы.
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 10))
+
+# Недоступная реплика исключается из выбора на это время.
+REPLICA_RETRY_SECONDS = int(os.getenv('REPLICA_RETRY_SECONDS', 30))
+
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+}
+
+# Кэш общий для всех процессов: версии справочников, токены и липкость
+# реплик должны видеть и воркеры gunicorn, и команды manage.py. Файловый
+# кэш общий в пределах одного контейнера, для нескольких нужен redis.
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'file')
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND],
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION',
+            '/tmp/foodgram_cache' if CACHE_BACKEND == 'file' else ''),
+    }
+}
+
+# Файловый и locmem кэш по умолчанию держат 300 записей и при переполнении
+# удаляют треть из них, вместе с версиями справочников и токенами.
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 100000))
+
+if CACHE_BACKEND in ('file', 'locmem'):
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': CACHE_MAX_ENTRIES}
+
+REFERENCE_CACHE_TIMEOUT = int(os.getenv('REFERENCE_CACHE_TIMEOUT', 86400))
+
+# Сколько живёт версия справочника: дольше этого срока процесс с
+# собственным кэшем (locmem) не отдаёт устаревший список.
+REFERENCE_VERSION_TIMEOUT = int(
+    os.getenv('REFERENCE_VERSION_TIMEOUT', 300))
+
+TOP_RECIPES_LIMIT = int(os.getenv('TOP_RECIPES_LIMIT', 10))
+
+TOP_RECIPES_CACHE_TIMEOUT = int(os.getenv('TOP_RECIPES_CACHE_TIMEOUT', 60))
+
+# max-age анонимных страниц списка рецептов для микрокэша nginx.
+RECIPE_LIST_MAX_AGE = int(os.getenv('RECIPE_LIST_MAX_AGE', 10))
+
+# Рецепты автора с большим числом подписчиков не рассылаются по лентам,
+# а подмешиваются при чтении ленты.
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', 1000))
+
+# Сколько последних рецептов автора попадает в ленту при подписке.
+FEED_BACKFILL_SIZE = int(os.getenv('FEED_BACKFILL_SIZE', 100))
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -113,6 +187,17 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+IMAGE_UPLOAD_MAX_SIZE = int(os.getenv('IMAGE_UPLOAD_MAX_SIZE', 10 * 2 ** 20))
+
+IMAGE_MAX_DIMENSION = int(os.getenv('IMAGE_MAX_DIMENSION', 6000))
+
+IMAGE_VARIANT_WIDTHS = (320, 640, 1280)
+
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+
+IMAGE_PROCESSING_ASYNC = (
+    os.getenv('IMAGE_PROCESSING_ASYNC', 'True').lower() == 'true')
+
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -122,13 +207,18 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'recipe.authentication.CachingTokenAuthentication',
     ],
 
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
     ],
 
+    'DEFAULT_RENDERER_CLASSES': [
+        'recipe.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+
     'DEFAULT_PAGINATION_CLASS': 'recipe.pagination.CustomPagination',
 
     'PAGE_SIZE': 6,
@@ -159,5 +249,35 @@ DJOSER = {
 
 }
 
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', 50))
+
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+)
+
+# Кэш токенов для чтения: общий кэш Django или LRU в памяти процесса.
+# Версии списков пользователя из кэша входят в ETag, поэтому LRU в памяти
+# годится только для одного процесса: сброс в другом воркере его не
+# затронет, и клиент получит устаревший ответ 304.
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+
+TOKEN_CACHE_TTL = int(os.getenv('TOKEN_CACHE_TTL', 60))
+
+TOKEN_CACHE_SHARED = (
+    os.getenv('TOKEN_CACHE_SHARED', 'True').lower() == 'true')
+
+# Под ASGI чтение рецептов, тегов и ингредиентов идёт в async-представления.
+ASYNC_READ_VIEWS = os.getenv('ASYNC_READ_VIEWS', 'True').lower() == 'true'
+
+# gzip и brotli в самом приложении, если перед ним нет nginx.
+RESPONSE_COMPRESSION = (
+    os.getenv('RESPONSE_COMPRESSION', 'False').lower() == 'true')
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True').lower() == 'true'
+
+# Запросы дольше порога пишутся в лог вместе с SQL, 0 отключает отчёт.
+METRICS_SLOW_REQUEST_MS = int(os.getenv('METRICS_SLOW_REQUEST_MS', 1000))
+
 
 CSRF_TRUSTED_ORIGINS = ['https://foodygram.webhop.me']
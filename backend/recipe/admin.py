@@ -1,6 +1,8 @@
 from django.contrib import admin
 
-from .models import Ingredient, Recipe, Subscription, Tag
+from .images import schedule_variants
+from .models import (Ingredient, IngredientRecipe, Recipe, ShoppingCartTotal,
+                     Subscription, Tag)
 
 
 @admin.register(Subscription)
@@ -43,7 +45,30 @@ class RecipeAdmin(admin.ModelAdmin):
     exclude = ('tags',)
     list_filter = ('name', 'author__username', 'tags__name')
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if "image" in form.changed_data:
+            schedule_variants(obj)
+
+    def get_amounts(self, recipe):
+        return dict(IngredientRecipe.objects.filter(
+            recipe=recipe).values_list('ingredient_id', 'amount'))
+
+    def save_related(self, request, form, formsets, change):
+        # Инлайн пишет строки напрямую, минуя сериализатор, поэтому
+        # разница количеств переносится в итоги корзин здесь.
+        recipe = form.instance
+        before = self.get_amounts(recipe) if change else {}
+        super().save_related(request, form, formsets, change)
+        after = self.get_amounts(recipe)
+        ShoppingCartTotal.objects.apply_recipe_deltas(recipe, {
+            ingredient_id: after.get(ingredient_id, 0)
+            - before.get(ingredient_id, 0)
+            for ingredient_id in before.keys() | after.keys()
+        })
+        Recipe.objects.filter(pk=recipe.pk).update_search_vector()
+
     def get_favorite_count(self, obj):
-        return obj.subscriptions.count()
+        return obj.favorites_count
 
     get_favorite_count.short_description = 'Favorites'
@@ -0,0 +1,21 @@
+from django.urls import include, path
+
+from .async_views import AsyncRecipeView, AsyncReferenceView
+from .views import IngredientViewSet, RecipeViewSet, TagViewSet
+
+# Маршруты ASGI для чтения, остальное совпадает с foodgram.urls.
+urlpatterns = [
+    path("api/recipes/", AsyncRecipeView.as_view(
+        viewset_class=RecipeViewSet, action="list")),
+    path("api/recipes/<int:pk>/", AsyncRecipeView.as_view(
+        viewset_class=RecipeViewSet, action="retrieve")),
+    path("api/tags/", AsyncReferenceView.as_view(
+        viewset_class=TagViewSet, action="list")),
+    path("api/tags/<int:pk>/", AsyncReferenceView.as_view(
+        viewset_class=TagViewSet, action="retrieve")),
+    path("api/ingredients/", AsyncReferenceView.as_view(
+        viewset_class=IngredientViewSet, action="list")),
+    path("api/ingredients/<int:pk>/", AsyncReferenceView.as_view(
+        viewset_class=IngredientViewSet, action="retrieve")),
+    path("", include("foodgram.urls")),
+]
@@ -0,0 +1,180 @@
+from asgiref.sync import (iscoroutinefunction, markcoroutinefunction,
+                          sync_to_async)
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.views import View
+from rest_framework.response import Response
+
+from . import cache
+
+
+def not_found(model):
+    # Тот же текст, что у get_object_or_404 в синхронных view.
+    return Http404(
+        f"No {model._meta.object_name} matches the given query.")
+
+
+class AsyncReadView(View):
+    """Асинхронное чтение поверх обычного ViewSet.
+
+    Аутентификация, права, фильтры и сериализаторы берутся из
+    viewset_class, а выборка идёт через async ORM: пока запрос ждёт
+    базу, воркер ASGI обслуживает другие соединения.
+    """
+
+    viewset_class = None
+    action = None
+    http_method_names = ['get', 'head']
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        # Как у ViewSet: метрики и выбор реплики видят класс и действие.
+        action = initkwargs.get('action', cls.action)
+        view.cls = initkwargs.get('viewset_class', cls.viewset_class)
+        view.actions = {'get': action, 'head': action}
+        return view
+
+    async def get(self, request, *args, **kwargs):
+        viewset = self.viewset_class(
+            action_map={'get': self.action, 'head': self.action})
+        viewset.args, viewset.kwargs = args, kwargs
+        request = viewset.initialize_request(request, *args, **kwargs)
+        viewset.request = request
+        viewset.headers = viewset.default_response_headers
+        try:
+            await sync_to_async(viewset.initial)(request, *args, **kwargs)
+            handler = getattr(self, self.action)
+            response = await handler(viewset, request, *args, **kwargs)
+        except Exception as exc:
+            response = viewset.handle_exception(exc)
+        return viewset.finalize_response(request, response, *args, **kwargs)
+
+    async def head(self, request, *args, **kwargs):
+        return await self.get(request, *args, **kwargs)
+
+    async def filter_queryset(self, viewset):
+        # Фильтры могут проверять значения по базе, поэтому синхронно.
+        return await sync_to_async(viewset.filter_queryset)(
+            viewset.get_queryset())
+
+    async def list_response(self, viewset, queryset):
+        paginator = viewset.paginator
+        if paginator is None:
+            items = [item async for item in queryset]
+            return Response(viewset.get_serializer(items, many=True).data)
+        page = await paginator.apaginate_queryset(
+            queryset, viewset.request, view=viewset)
+        return viewset.get_paginated_response(
+            viewset.get_serializer(page, many=True).data)
+
+    async def get_instance(self, viewset, pk):
+        queryset = await self.filter_queryset(viewset)
+        try:
+            instance = await queryset.filter(pk=pk).afirst()
+        except (TypeError, ValueError):
+            instance = None
+        if instance is None:
+            raise not_found(queryset.model)
+        viewset.check_object_permissions(viewset.request, instance)
+        return instance
+
+    async def list(self, viewset, request):
+        return await self.list_response(
+            viewset, await self.filter_queryset(viewset))
+
+    async def retrieve(self, viewset, request, pk):
+        instance = await self.get_instance(viewset, pk)
+        return Response(viewset.get_serializer(instance).data)
+
+
+class AsyncReferenceView(AsyncReadView):
+    """Теги и ингредиенты: список без параметров отдаётся из кэша."""
+
+    async def list(self, viewset, request):
+        if request.query_params:
+            return await super().list(viewset, request)
+        name = viewset.cache_name
+        version = cache.get_version(name)
+        etag = cache.get_etag(name, version)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            content = await sync_to_async(cache.get_or_build)(
+                name, version, viewset.render_cached_list)
+            response = HttpResponse(
+                content, content_type='application/json')
+        response['ETag'] = etag
+        patch_cache_control(response, no_cache=True)
+        return response
+
+
+class AsyncRecipeView(AsyncReadView):
+    """Список и карточка рецепта с ETag, как у RecipeViewSet."""
+
+    async def conditional(self, viewset, request, etag, last_modified,
+                          render, max_age=None):
+        timestamp = viewset.get_timestamp(request, last_modified)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = await render()
+        return viewset.patch_conditional(
+            request, response, etag, timestamp, max_age)
+
+    async def list(self, viewset, request):
+        etag, last_modified = viewset.get_list_validators(request)
+
+        async def render():
+            return await self.list_response(
+                viewset, await self.filter_queryset(viewset))
+
+        return await self.conditional(
+            viewset, request, etag, last_modified, render,
+            max_age=settings.RECIPE_LIST_MAX_AGE)
+
+    async def retrieve(self, viewset, request, pk):
+        try:
+            state = await viewset.get_detail_state(pk).afirst()
+        except (TypeError, ValueError):
+            state = None
+        if state is None:
+            raise not_found(viewset.queryset.model)
+        return await self.conditional(
+            viewset, request, *viewset.get_detail_validators(pk, state),
+            lambda: super(AsyncRecipeView, self).retrieve(
+                viewset, request, pk))
+
+
+class AsyncViewsMiddleware:
+    """Под ASGI отправляет GET и HEAD в асинхронные представления.
+
+    Для остальных методов и под WSGI маршруты не меняются.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.ASYNC_READ_VIEWS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def route(self, request):
+        if (isinstance(request, ASGIRequest)
+                and request.method in ('GET', 'HEAD')):
+            request.urlconf = 'recipe.async_urls'
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        self.route(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        self.route(request)
+        return await self.get_response(request)
@@ -0,0 +1,132 @@
+import copy
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.permissions import SAFE_METHODS
+
+TOKEN_KEY = 'auth:token:{}'
+GENERATION_KEY = 'auth:generation:{}'
+
+
+class LocalTokenCache:
+    """LRU токенов в памяти процесса с ограниченным временем жизни."""
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.user_keys = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.monotonic():
+                self.pop(key)
+                return None
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            self.user_keys.setdefault(value[0].pk, set()).add(key)
+            while len(self.entries) > self.size:
+                self.pop(next(iter(self.entries)))
+
+    def pop(self, key):
+        (user, _), _ = self.entries.pop(key)
+        keys = self.user_keys.get(user.pk)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.user_keys[user.pk]
+
+    def delete_keys(self, keys):
+        with self.lock:
+            for key in keys:
+                if key in self.entries:
+                    self.pop(key)
+
+    def delete_users(self, user_ids):
+        with self.lock:
+            for user_id in user_ids:
+                for key in list(self.user_keys.get(user_id, ())):
+                    self.pop(key)
+
+
+class SharedTokenCache:
+    """Токены в общем кэше Django: сброс виден всем процессам.
+
+    Запись хранит поколение пользователя и годится, только пока оно
+    совпадает с текущим. Сброс пользователя меняет поколение, поэтому
+    обратный индекс токенов не нужен, а вытеснение ключа поколения
+    лишь делает записи пользователя недействительными.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+
+    def get(self, key):
+        entry = cache.get(TOKEN_KEY.format(key))
+        if entry is None:
+            return None
+        user, token, generation = entry
+        if cache.get(GENERATION_KEY.format(user.pk)) != generation:
+            return None
+        return user, token
+
+    def set(self, key, value):
+        generation = cache.get_or_set(
+            GENERATION_KEY.format(value[0].pk), uuid.uuid4().hex,
+            timeout=self.ttl)
+        cache.set(TOKEN_KEY.format(key), (*value, generation),
+                  timeout=self.ttl)
+
+    def delete_keys(self, keys):
+        cache.delete_many([TOKEN_KEY.format(key) for key in keys])
+
+    def delete_users(self, user_ids):
+        cache.set_many({
+            GENERATION_KEY.format(pk): uuid.uuid4().hex for pk in user_ids
+        }, timeout=self.ttl)
+
+
+if settings.TOKEN_CACHE_SHARED:
+    token_cache = SharedTokenCache(settings.TOKEN_CACHE_TTL)
+else:
+    token_cache = LocalTokenCache(
+        settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_TTL)
+
+
+class CachingTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication, которая для чтения берёт токен из кэша.
+
+    Изменяющие запросы всегда проверяют токен по базе, поэтому
+    сохранение устаревшего пользователя из кэша исключено.
+    """
+
+    def authenticate(self, request):
+        self.cacheable = request.method in SAFE_METHODS
+        return super().authenticate(request)
+
+    def authenticate_credentials(self, key):
+        if not self.cacheable:
+            return super().authenticate_credentials(key)
+        cached = token_cache.get(key)
+        if cached is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, (user, token))
+            cached = (user, token)
+        # Копии: объекты из кэша не должны меняться внутри запроса.
+        user, token = map(copy.copy, cached)
+        token.user = user
+        return user, token
@@ -0,0 +1,48 @@
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import quote_etag
+
+VERSION_KEY = 'reference:{}:version'
+CONTENT_KEY = 'reference:{}:{}'
+
+_local = {}
+_lock = threading.Lock()
+
+
+def get_version(name):
+    """Текущая версия набора данных из общего кэша."""
+    key = VERSION_KEY.format(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex,
+                  timeout=settings.REFERENCE_VERSION_TIMEOUT)
+        version = cache.get(key)
+    return version
+
+
+def get_etag(name, version):
+    return quote_etag(f'{name}-{version}')
+
+
+def invalidate(*names):
+    for name in names:
+        cache.set(VERSION_KEY.format(name), uuid.uuid4().hex,
+                  timeout=settings.REFERENCE_VERSION_TIMEOUT)
+
+
+def get_or_build(name, version, build):
+    """Содержимое набора: из памяти процесса, общего кэша или build()."""
+    entry = _local.get(name)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+    key = CONTENT_KEY.format(name, version)
+    content = cache.get(key)
+    if content is None:
+        content = build()
+        cache.set(key, content, timeout=settings.REFERENCE_CACHE_TIMEOUT)
+    with _lock:
+        _local[name] = (version, content)
+    return content
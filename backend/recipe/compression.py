@@ -0,0 +1,55 @@
+import re
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+re_accepts_brotli = re.compile(r'\bbr\b')
+
+BROTLI_QUALITY = 5
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """Сжатие ответов для развёртываний без nginx.
+
+    Brotli выбирается, если клиент его принимает и установлен пакет
+    brotli; потоковые ответы и остальные клиенты получают gzip.
+    """
+
+    def __init__(self, get_response):
+        if not settings.RESPONSE_COMPRESSION:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def accepts_brotli(self, request, response):
+        return (
+            brotli is not None
+            and not response.streaming
+            and not response.has_header('Content-Encoding')
+            and len(response.content) >= 200
+            and re_accepts_brotli.search(
+                request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        )
+
+    def process_response(self, request, response):
+        if not self.accepts_brotli(request, response):
+            return super().process_response(request, response)
+        patch_vary_headers(response, ('Accept-Encoding',))
+        compressed = brotli.compress(
+            response.content, mode=brotli.MODE_TEXT, quality=BROTLI_QUALITY)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+        # Как в GZipMiddleware: сильный ETag после сжатия становится слабым.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
@@ -0,0 +1,16 @@
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_related(model, field, queryset=None):
+    """Число строк model (или queryset), ссылающихся полем field на запись.
+
+    Не зависит от текущих моделей, поэтому используется и в миграциях.
+    """
+    if queryset is None:
+        queryset = model.objects.all()
+    return Coalesce(Subquery(
+        queryset.filter(
+            **{field: OuterRef("pk")}
+        ).values(field).annotate(total=Count("pk")).values("total")
+    ), Value(0))
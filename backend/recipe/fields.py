@@ -1,15 +1,58 @@
 import base64
+import binascii
+from tempfile import SpooledTemporaryFile
 
+from django.conf import settings
+from django.core.files import File
+from PIL import Image
 from rest_framework import serializers
-from django.core.files.base import ContentFile
+
+# Кратно 4, чтобы каждый кусок декодировался независимо.
+DECODE_CHUNK_SIZE = 64 * 1024
 
 
 class Base64ImageField(serializers.ImageField):
+    default_error_messages = {
+        'invalid_base64': 'Некорректные данные изображения.',
+        'too_large': 'Размер изображения больше {max_size} байт.',
+        'too_big_dimensions': (
+            'Размеры изображения больше {max_dimension} пикселей.'),
+    }
+
+    def decode(self, imgstr):
+        # Клиенты переносят длинный base64 по строкам: пробелы и переводы
+        # строк убираются до деления на куски, иначе сдвинется выравнивание.
+        imgstr = "".join(imgstr.split())
+        if len(imgstr) * 3 // 4 > settings.IMAGE_UPLOAD_MAX_SIZE:
+            self.fail('too_large', max_size=settings.IMAGE_UPLOAD_MAX_SIZE)
+        buffer = SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+        try:
+            for start in range(0, len(imgstr), DECODE_CHUNK_SIZE):
+                buffer.write(base64.b64decode(
+                    imgstr[start:start + DECODE_CHUNK_SIZE], validate=True))
+        except (binascii.Error, ValueError):
+            self.fail('invalid_base64')
+        buffer.seek(0)
+        return buffer
+
+    def check_dimensions(self, buffer):
+        try:
+            width, height = Image.open(buffer).size
+        except Exception:
+            self.fail('invalid_image')
+        buffer.seek(0)
+        if max(width, height) > settings.IMAGE_MAX_DIMENSION:
+            self.fail('too_big_dimensions',
+                      max_dimension=settings.IMAGE_MAX_DIMENSION)
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith("data:image"):
             format, imgstr = data.split(";base64,")
             ext = format.split("/")[-1]
 
-            data = ContentFile(base64.b64decode(imgstr), name="temp." + ext)
+            buffer = self.decode(imgstr)
+            self.check_dimensions(buffer)
+            data = File(buffer, name="temp." + ext)
 
         return super().to_internal_value(data)
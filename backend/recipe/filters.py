@@ -1,11 +1,37 @@
 import django_filters
+from django.db.models import Count, Exists, OuterRef
 
-from .models import Ingredient, Recipe
+from . import cache, replicas
+from .models import Ingredient, Recipe, Tag
+from .search import search_ingredients, search_recipes, with_all_ingredients
+
+TAGS_MATCH_CHOICES = (('any', 'any'), ('all', 'all'))
+
+
+def get_tag_ids():
+    """Слаг -> id тега, кэш сбрасывается вместе со списком тегов."""
+    def build():
+        with replicas.primary():
+            return dict(Tag.objects.values_list('slug', 'id'))
+
+    return cache.get_or_build(
+        'tags:slugs', cache.get_version('tags'), build)
+
+
+def get_tag_choices():
+    return [(slug, slug) for slug in get_tag_ids()]
+
+
+class NumberInFilter(django_filters.BaseInFilter,
+                     django_filters.NumberFilter):
+    pass
 
 
 class IngredientFilter(django_filters.FilterSet):
-    name = django_filters.CharFilter(field_name='name',
-                                     lookup_expr='startswith')
+    name = django_filters.CharFilter(method='filter_name')
+
+    def filter_name(self, queryset, name, value):
+        return search_ingredients(queryset, value)
 
     class Meta:
         model = Ingredient
@@ -17,7 +43,12 @@ class RecipeFilter(django_filters.FilterSet):
     is_in_shopping_cart = django_filters.CharFilter(
         method='filter_is_in_shopping_cart')
     author = django_filters.NumberFilter(field_name='author__id')
-    tags = django_filters.AllValuesMultipleFilter(field_name='tags__slug')
+    tags = django_filters.MultipleChoiceFilter(
+        choices=get_tag_choices, method='filter_tags')
+    tags_match = django_filters.ChoiceFilter(
+        choices=TAGS_MATCH_CHOICES, method='filter_tags_match')
+    search = django_filters.CharFilter(method='filter_search')
+    ingredients = NumberInFilter(method='filter_ingredients')
 
     def get_favorited(self, queryset, name, value):
         if self.request.user.is_authenticated and value == '1':
@@ -29,6 +60,33 @@ class RecipeFilter(django_filters.FilterSet):
             return queryset.filter(shopping_cart=self.request.user)
         return queryset
 
+    def filter_tags(self, queryset, name, value):
+        """Рецепты с любым из тегов или, при tags_match=all, со всеми.
+
+        Один Exists по связи рецепта с тегами: без join, поэтому
+        рецепт с несколькими подходящими тегами не повторяется.
+        """
+        tag_ids = get_tag_ids()
+        ids = {tag_ids[slug] for slug in value if slug in tag_ids}
+        recipe_tags = Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk'), tag_id__in=ids)
+        if self.form.cleaned_data.get('tags_match') == 'all':
+            recipe_tags = recipe_tags.values('recipe').annotate(
+                matched=Count('tag')
+            ).filter(matched=len(ids))
+        return queryset.filter(Exists(recipe_tags))
+
+    def filter_tags_match(self, queryset, name, value):
+        # Учитывается в filter_tags.
+        return queryset
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
+
+    def filter_ingredients(self, queryset, name, value):
+        return with_all_ingredients(queryset, (int(pk) for pk in value))
+
     class Meta:
         model = Recipe
-        fields = ['tags', 'author', 'is_favorited', 'is_in_shopping_cart']
+        fields = ['tags', 'tags_match', 'author', 'is_favorited',
+                  'is_in_shopping_cart', 'search', 'ingredients']
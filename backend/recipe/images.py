@@ -0,0 +1,99 @@
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image
+
+from . import cache
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 85, 'progressive': True,
+             'optimize': True},
+}
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_WORKERS, thread_name_prefix='recipe-images')
+
+
+def flatten(image):
+    """RGB без прозрачности: JPEG её не поддерживает."""
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def render_variants(name):
+    """Уменьшенные копии изображения во всех форматах и ширинах."""
+    stem = os.path.splitext(os.path.basename(name))[0]
+    variants = {key: {} for key in FORMATS}
+    with default_storage.open(name) as file:
+        original = flatten(Image.open(file))
+    widths = [
+        width for width in settings.IMAGE_VARIANT_WIDTHS
+        if width < original.width
+    ] or [original.width]
+    for width in widths:
+        resized = original.copy()
+        resized.thumbnail((width, original.height))
+        for key, options in FORMATS.items():
+            buffer = io.BytesIO()
+            resized.save(buffer, **options)
+            variants[key][str(width)] = default_storage.save(
+                f'recipes/images/variants/{stem}_{width}.{key}',
+                ContentFile(buffer.getvalue()),
+            )
+    return variants
+
+
+def delete_variants(variants):
+    for paths in variants.values():
+        for path in paths.values():
+            default_storage.delete(path)
+
+
+def build_variants(recipe_id, name):
+    try:
+        variants = render_variants(name)
+        previous = Recipe.objects.filter(pk=recipe_id).values_list(
+            'image_variants', flat=True).first()
+        updated = Recipe.objects.filter(pk=recipe_id, image=name).update(
+            image_variants=variants, updated_at=timezone.now())
+    except Exception:
+        logger.exception('Failed to build image variants for %s', name)
+        return
+    if updated:
+        cache.invalidate('recipes')
+    # Если изображение успели заменить, новые варианты уже не нужны.
+    delete_variants((previous or {}) if updated else variants)
+
+
+def build_variants_in_worker(recipe_id, name):
+    try:
+        build_variants(recipe_id, name)
+    finally:
+        close_old_connections()
+
+
+def schedule_variants(recipe):
+    """Ставит построение вариантов в очередь после коммита транзакции."""
+    if not recipe.image:
+        return
+    recipe_id, name = recipe.pk, recipe.image.name
+    if settings.IMAGE_PROCESSING_ASYNC:
+        transaction.on_commit(lambda: executor.submit(
+            build_variants_in_worker, recipe_id, name))
+    else:
+        transaction.on_commit(lambda: build_variants(recipe_id, name))
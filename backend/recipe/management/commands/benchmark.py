@@ -0,0 +1,371 @@
+import asyncio
+import json
+import platform
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.db.models import Count
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from recipe.models import Ingredient, Recipe, Tag
+
+User = get_user_model()
+
+
+def get_endpoints(recipe, author, tag, ingredient):
+    """Сценарии: имя, URL и нужна ли авторизация."""
+    recipes = reverse("recipe-list")
+    return [
+        ("recipes.list", recipes, False),
+        ("recipes.list.auth", recipes, True),
+        ("recipes.list.cursor", f"{recipes}?cursor=", False),
+        ("recipes.list.tag", f"{recipes}?tags={tag.slug}", False),
+        ("recipes.list.author", f"{recipes}?author={author.pk}", False),
+        ("recipes.list.favorited", f"{recipes}?is_favorited=1", True),
+        ("recipes.search", f"{recipes}?search={recipe.name}", False),
+        ("recipes.detail",
+         reverse("recipe-detail", args=[recipe.pk]), True),
+        ("recipes.top", reverse("recipe-top"), False),
+        ("recipes.feed", reverse("recipe-feed"), True),
+        ("recipes.shopping_cart.summary",
+         reverse("recipe-shopping-cart-summary"), True),
+        ("recipes.download_shopping_cart",
+         reverse("recipe-download-shopping-cart"), True),
+        ("tags.list", reverse("tag-list"), False),
+        ("ingredients.search",
+         f"{reverse('ingredient-list')}?name={ingredient.name[:3]}", False),
+        ("users.list", reverse("user-list"), False),
+        ("users.me", reverse("user-me"), True),
+        ("users.me.state", reverse("user-state"), True),
+        ("users.me.state.page",
+         f"{reverse('user-state')}?recipes={recipe.pk}&authors={author.pk}",
+         True),
+        ("users.detail", reverse("user-detail", args=[author.pk]), True),
+        ("users.subscriptions",
+         f"{reverse('user-subscriptions')}?recipes_limit=3", True),
+    ]
+
+
+def split(total, parts):
+    """Число запросов на каждого из parts параллельных клиентов."""
+    return [total // parts + (index < total % parts)
+            for index in range(parts)]
+
+
+class QueryCounter:
+    """Считает SQL-запросы на всех соединениях процесса.
+
+    Под ASGI и в потоках запросы идут через свои соединения, поэтому
+    обёртка добавляется и ко всем соединениям, открытым позже.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self.lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def attach(self, connection, **kwargs):
+        # В начало списка: execute_wrapper() при выходе снимает последнюю
+        # обёртку, а соединение может открыться внутри запроса.
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.insert(0, self)
+
+    def __enter__(self):
+        for existing in connections.all():
+            self.attach(existing)
+        connection_created.connect(self.attach)
+        return self
+
+    def __exit__(self, *exc_info):
+        connection_created.disconnect(self.attach)
+        for existing in connections.all(initialized_only=True):
+            if self in existing.execute_wrappers:
+                existing.execute_wrappers.remove(self)
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1,
+                max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs the API routes in-process and reports p50/p95/p99 latency, "
+        "queries per request and throughput for each endpoint. Results "
+        "can be saved as a JSON baseline and compared with a later run"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--requests", type=int, default=50,
+            help="Measured requests per endpoint (default: 50)",
+        )
+        parser.add_argument(
+            "--warmup", type=int, default=5,
+            help="Unmeasured requests per endpoint before measuring",
+        )
+        parser.add_argument(
+            "--server", choices=("wsgi", "asgi"), default="wsgi",
+            help="Run requests through the WSGI or the ASGI handler",
+        )
+        parser.add_argument(
+            "--concurrency", type=int, default=1,
+            help="Requests in flight at once: threads under WSGI, "
+                 "tasks under ASGI (default: 1)",
+        )
+        parser.add_argument(
+            "--endpoint", action="append", default=[],
+            help="Only run endpoints whose name starts with this prefix",
+        )
+        parser.add_argument(
+            "--user",
+            help="Username for authenticated requests, by default the "
+                 "user with the most shopping cart recipes",
+        )
+        parser.add_argument("--output", help="Write results to this file")
+        parser.add_argument(
+            "--baseline", help="Compare results with this JSON file")
+        parser.add_argument(
+            "--compare",
+            help="Show throughput side by side with this JSON file, "
+                 "without checking for regressions",
+        )
+        parser.add_argument(
+            "--tolerance", type=float, default=0.25,
+            help="Allowed p95 slowdown against the baseline (default: 0.25)",
+        )
+        parser.add_argument(
+            "--min-delta-ms", type=float, default=2,
+            help="Ignore p95 slowdowns smaller than this (default: 2 ms)",
+        )
+
+    def get_fixtures(self, username):
+        users = User.objects.all()
+        if username:
+            user = users.filter(username=username).first()
+        else:
+            user = users.annotate(
+                carts=Count("shoping_recipes")).order_by("-carts").first()
+        author = users.annotate(
+            total=Count("recipes")).order_by("-total").first()
+        recipe = Recipe.objects.order_by("-favorites_count").first()
+        tag = Tag.objects.first()
+        ingredient = Ingredient.objects.first()
+        if None in (user, author, recipe, tag, ingredient):
+            raise CommandError(
+                "Not enough data, run generate_data first")
+        return user, recipe, author, tag, ingredient
+
+    def get_headers(self, user=None):
+        host = next(
+            (host for host in settings.ALLOWED_HOSTS if host != "*"),
+            "localhost").lstrip(".")
+        headers = {"Host": host}
+        if user is not None:
+            token, _ = Token.objects.get_or_create(user=user)
+            headers["Authorization"] = f"Token {token.key}"
+        return headers
+
+    def run_wsgi(self, url, headers, requests, concurrency):
+        def worker(count):
+            client, results = Client(), []
+            try:
+                for _ in range(count):
+                    started = time.perf_counter()
+                    response = client.get(url, headers=headers)
+                    if response.streaming:
+                        b"".join(response.streaming_content)
+                    results.append(
+                        (time.perf_counter() - started, response.status_code))
+            finally:
+                if concurrency > 1:
+                    connection.close()
+            return results
+
+        if concurrency == 1:
+            return worker(requests)
+        with ThreadPoolExecutor(concurrency) as executor:
+            return [result for results in executor.map(
+                worker, split(requests, concurrency)) for result in results]
+
+    def run_asgi(self, url, headers, requests, concurrency):
+        async def worker(client, count):
+            results = []
+            for _ in range(count):
+                started = time.perf_counter()
+                response = await client.get(url, headers=headers)
+                if response.streaming:
+                    content = response.streaming_content
+                    if hasattr(content, "__aiter__"):
+                        [chunk async for chunk in content]
+                    else:
+                        # Как ASGIHandler: синхронный итератор в потоке.
+                        await sync_to_async(b"".join)(content)
+                results.append(
+                    (time.perf_counter() - started, response.status_code))
+            return results
+
+        async def run():
+            client = AsyncClient()
+            return await asyncio.gather(*(
+                worker(client, count)
+                for count in split(requests, concurrency)))
+
+        # AsyncClient всегда передаёт Host: testserver.
+        headers = {name: value for name, value in headers.items()
+                   if name != "Host"}
+        with override_settings(
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+            return [result for results in asyncio.run(run())
+                    for result in results]
+
+    def measure(self, url, headers, options):
+        run = self.run_asgi if options["server"] == "asgi" else self.run_wsgi
+        requests, concurrency = options["requests"], options["concurrency"]
+        if options["warmup"]:
+            run(url, headers, options["warmup"], concurrency)
+        self.queries.count = 0
+        started = time.perf_counter()
+        results = run(url, headers, requests, concurrency)
+        elapsed = time.perf_counter() - started
+        for _, status_code in results:
+            if status_code >= 400:
+                raise CommandError(f"{url} returned {status_code}")
+        timings = sorted(timing for timing, _ in results)
+        return {
+            "p50_ms": round(percentile(timings, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(timings, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(timings, 0.99) * 1000, 2),
+            "queries": round(self.queries.count / requests, 2),
+            "throughput_rps": round(requests / elapsed, 1),
+        }
+
+    def handle(self, *args, **options):
+        if options["requests"] < 1:
+            raise CommandError("--requests must be positive")
+        if not 1 <= options["concurrency"] <= options["requests"]:
+            raise CommandError(
+                "--concurrency must be between 1 and --requests")
+        user, *fixtures = self.get_fixtures(options["user"])
+        endpoints = [
+            endpoint
+            for endpoint in get_endpoints(*fixtures)
+            if not options["endpoint"] or endpoint[0].startswith(
+                tuple(options["endpoint"]))
+        ]
+        anonymous, authenticated = self.get_headers(), self.get_headers(user)
+
+        results = {}
+        self.stdout.write(
+            f"{'endpoint':34} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+            f"{'queries':>8} {'req/s':>8}")
+        with QueryCounter() as self.queries:
+            for name, url, needs_auth in endpoints:
+                result = results[name] = self.measure(
+                    url, authenticated if needs_auth else anonymous, options)
+                self.stdout.write(
+                    f"{name:34} {result['p50_ms']:8.2f} "
+                    f"{result['p95_ms']:8.2f} {result['p99_ms']:8.2f} "
+                    f"{result['queries']:8.1f} "
+                    f"{result['throughput_rps']:8.1f}")
+
+        report = {
+            "meta": {
+                "created": datetime.now(timezone.utc).isoformat(),
+                "database": connection.vendor,
+                "server": options["server"],
+                "concurrency": options["concurrency"],
+                "python": platform.python_version(),
+                "requests": options["requests"],
+                "recipes": Recipe.objects.count(),
+                "users": User.objects.count(),
+            },
+            "endpoints": results,
+        }
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as file:
+                json.dump(report, file, indent=2, ensure_ascii=False)
+                file.write("\n")
+        if options["compare"]:
+            self.compare_throughput(report, options["compare"])
+        if options["baseline"]:
+            self.compare(report, options["baseline"], options["tolerance"],
+                         options["min_delta_ms"])
+
+    def load_report(self, path):
+        with open(path, encoding="utf-8") as file:
+            return json.load(file)
+
+    def compare_throughput(self, report, path):
+        """req/s двух прогонов рядом, например WSGI и ASGI."""
+        other = self.load_report(path)
+        labels = [
+            f"{meta.get('server', 'wsgi')} x{meta.get('concurrency', 1)}"
+            for meta in (other["meta"], report["meta"])
+        ]
+        self.stdout.write(f"\nThroughput against {path}:")
+        self.stdout.write(
+            f"{'endpoint':34} {labels[0]:>12} {labels[1]:>12} "
+            f"{'change':>8}")
+        for name, result in report["endpoints"].items():
+            previous = other["endpoints"].get(name)
+            if previous is None:
+                self.stdout.write(f"{name:34} new endpoint")
+                continue
+            change = (result["throughput_rps"]
+                      / max(previous["throughput_rps"], 1e-6) - 1)
+            self.stdout.write(
+                f"{name:34} {previous['throughput_rps']:12.1f} "
+                f"{result['throughput_rps']:12.1f} {change:+8.0%}")
+
+    def compare(self, report, path, tolerance, min_delta_ms):
+        previous_report = self.load_report(path)
+        # Под нагрузкой p95 растёт от очереди запросов, поэтому прогоны
+        # с разной параллельностью или сервером так не сравниваются.
+        for field in ("server", "concurrency"):
+            previous = previous_report["meta"].get(field)
+            if previous is not None and previous != report["meta"][field]:
+                raise CommandError(
+                    f"{path} was recorded with {field} {previous}, "
+                    f"not {report['meta'][field]}; use --compare to put "
+                    f"throughput side by side")
+        results = report["endpoints"]
+        baseline = previous_report["endpoints"]
+        regressions = []
+        self.stdout.write(f"\nCompared with {path}:")
+        for name, result in results.items():
+            previous = baseline.get(name)
+            if previous is None:
+                self.stdout.write(f"{name:34} new endpoint")
+                continue
+            change = result["p95_ms"] / max(previous["p95_ms"], 1e-6) - 1
+            slower = (change > tolerance and result["p95_ms"]
+                      - previous["p95_ms"] > min_delta_ms)
+            more_queries = result["queries"] > previous["queries"]
+            line = (
+                f"{name:34} p95 {previous['p95_ms']:.2f} -> "
+                f"{result['p95_ms']:.2f} ms ({change:+.0%}), queries "
+                f"{previous['queries']:g} -> {result['queries']:g}")
+            if slower or more_queries:
+                regressions.append(name)
+                line = self.style.ERROR(line)
+            self.stdout.write(line)
+        if regressions:
+            raise CommandError(
+                f"Regressions in {len(regressions)} endpoints: "
+                f"{', '.join(regressions)}")
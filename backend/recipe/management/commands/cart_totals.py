@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipe.models import Recipe, ShoppingCartTotal
+
+
+class Command(BaseCommand):
+    help = "Rebuilds or verifies the materialized shopping cart totals"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Only compare stored totals with the carts, do not rebuild",
+        )
+
+    def handle(self, *args, **options):
+        if not options["verify"]:
+            ShoppingCartTotal.objects.rebuild()
+            self.stdout.write(self.style.SUCCESS(
+                "Rebuilt {} cart totals".format(
+                    ShoppingCartTotal.objects.count())))
+            return
+
+        expected = ShoppingCartTotal.objects.cart_deltas(
+            Recipe.shopping_cart.through.objects.all())
+        stored = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount
+            in ShoppingCartTotal.objects.values_list(
+                "user_id", "ingredient_id", "amount")
+        }
+        mismatches = [
+            key for key in expected.keys() | stored.keys()
+            if expected.get(key) != stored.get(key)
+        ]
+        for user_id, ingredient_id in mismatches:
+            self.stdout.write(
+                f"user={user_id} ingredient={ingredient_id}: "
+                f"stored={stored.get((user_id, ingredient_id))} "
+                f"expected={expected.get((user_id, ingredient_id))}")
+        if mismatches:
+            raise CommandError(
+                f"{len(mismatches)} cart totals are out of date, "
+                "run cart_totals without --verify to rebuild them")
+        self.stdout.write(self.style.SUCCESS("Cart totals are consistent"))
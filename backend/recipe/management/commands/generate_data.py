@@ -0,0 +1,215 @@
+import random
+import time
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipe import cache
+from recipe.expressions import count_related
+from recipe.models import (Ingredient, IngredientRecipe, Recipe,
+                           ShoppingCartTotal, Subscription, Tag,
+                           TimelineEntry)
+
+User = get_user_model()
+
+BENCHMARK_PASSWORD = "benchmark-password"
+
+
+def zipf_weights(size, exponent):
+    """Накопленные веса: первые элементы выбираются гораздо чаще."""
+    return list(accumulate(1 / rank ** exponent
+                           for rank in range(1, size + 1)))
+
+
+def skewed_pairs(rng, left, right, count, weights, exclude_self=False):
+    """Уникальные пары (left, right), right выбирается по весам."""
+    pairs = set()
+    attempts = 0
+    while len(pairs) < count and attempts < count * 10:
+        attempts += 1
+        first = rng.choice(left)
+        second = rng.choices(right, cum_weights=weights)[0]
+        if exclude_self and first == second:
+            continue
+        pairs.add((first, second))
+    return pairs
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates a reproducible synthetic dataset for benchmarks: users, "
+        "recipes, favorites, shopping carts and subscriptions with a "
+        "long-tail popularity distribution"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--recipes", type=int, default=5000)
+        parser.add_argument("--ingredients-per-recipe", type=int, default=8)
+        parser.add_argument("--favorites", type=int, default=20000)
+        parser.add_argument("--carts", type=int, default=5000)
+        parser.add_argument("--subscriptions", type=int, default=10000)
+        parser.add_argument(
+            "--skew", type=float, default=1.1,
+            help="Zipf exponent of author and recipe popularity",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--prefix", default="bench")
+        parser.add_argument("--batch-size", type=int, default=2000)
+        parser.add_argument(
+            "--flush", action="store_true",
+            help="Delete a previously generated dataset with this prefix",
+        )
+
+    def handle(self, *args, **options):
+        prefix = options["prefix"]
+        existing = User.objects.filter(username__startswith=prefix)
+        if options["flush"]:
+            existing.delete()
+        elif existing.exists():
+            raise CommandError(
+                f"Users with prefix '{prefix}' already exist, "
+                "use --flush to replace them")
+
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        self.skew = options["skew"]
+        started = time.monotonic()
+        with transaction.atomic():
+            users = self.create_users(prefix, options["users"])
+            ingredients = self.get_ingredients(
+                options["ingredients_per_recipe"])
+            tags = self.get_tags()
+            recipes = self.create_recipes(
+                users, ingredients, tags, options["recipes"],
+                options["ingredients_per_recipe"])
+            self.create_links(users, recipes, options)
+            self.refresh_denormalized(
+                Recipe.objects.filter(author__username__startswith=prefix))
+        cache.invalidate(
+            "tags", "ingredients", "recipes", "recipe_counters")
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {len(users)} users and {len(recipes)} recipes "
+            f"in {time.monotonic() - started:.1f}s. Password for all "
+            f"users: {BENCHMARK_PASSWORD}"))
+
+    def create_users(self, prefix, count):
+        password = make_password(BENCHMARK_PASSWORD)
+        User.objects.bulk_create(
+            (
+                User(
+                    username=f"{prefix}{number}",
+                    email=f"{prefix}{number}@example.com",
+                    first_name="Bench",
+                    last_name=f"User {number}",
+                    password=password,
+                )
+                for number in range(count)
+            ),
+            batch_size=self.batch_size,
+        )
+        # Порядок id совпадает с номером: bench0 — самый популярный автор.
+        return list(User.objects.filter(
+            username__startswith=prefix).order_by("id").values_list(
+            "id", flat=True))
+
+    def get_ingredients(self, per_recipe):
+        needed = max(per_recipe * 20, 200)
+        missing = needed - Ingredient.objects.count()
+        if missing > 0:
+            Ingredient.objects.bulk_create(
+                [Ingredient(name=f"bench ingredient {number}",
+                            measurement_unit="г")
+                 for number in range(missing)],
+                ignore_conflicts=True,
+            )
+        return list(Ingredient.objects.order_by("id").values_list(
+            "id", flat=True))
+
+    def get_tags(self):
+        if not Tag.objects.exists():
+            Tag.objects.bulk_create([
+                Tag(name=name, slug=slug, color=color)
+                for name, slug, color in (
+                    ("Завтрак", "breakfast", "#E26C2D"),
+                    ("Обед", "lunch", "#49B64E"),
+                    ("Ужин", "dinner", "#8775D2"),
+                )
+            ])
+        return list(Tag.objects.order_by("id").values_list("id", flat=True))
+
+    def create_recipes(self, users, ingredients, tags, count, per_recipe):
+        author_weights = zipf_weights(len(users), self.skew)
+        ingredient_weights = zipf_weights(len(ingredients), 0.8)
+        authors = self.rng.choices(users, cum_weights=author_weights, k=count)
+        recipe_ids = []
+        for start in range(0, count, self.batch_size):
+            batch = Recipe.objects.bulk_create([
+                Recipe(
+                    name=f"Рецепт {number}",
+                    text=f"Описание рецепта {number}",
+                    cooking_time=self.rng.randint(5, 180),
+                    author_id=authors[number],
+                )
+                for number in range(
+                    start, min(start + self.batch_size, count))
+            ])
+            tag_links, rows = [], []
+            for recipe in batch:
+                tag_links.extend(
+                    Recipe.tags.through(recipe_id=recipe.pk, tag_id=tag_id)
+                    for tag_id in self.rng.sample(
+                        tags, self.rng.randint(1, min(3, len(tags)))))
+                chosen = set()
+                while len(chosen) < min(per_recipe, len(ingredients)):
+                    chosen.add(self.rng.choices(
+                        ingredients, cum_weights=ingredient_weights)[0])
+                rows.extend(
+                    IngredientRecipe(recipe_id=recipe.pk,
+                                     ingredient_id=ingredient_id,
+                                     amount=self.rng.randint(1, 500))
+                    for ingredient_id in chosen)
+            Recipe.tags.through.objects.bulk_create(tag_links)
+            IngredientRecipe.objects.bulk_create(
+                rows, batch_size=self.batch_size)
+            recipe_ids.extend(recipe.pk for recipe in batch)
+        return recipe_ids
+
+    def create_links(self, users, recipes, options):
+        recipe_weights = zipf_weights(len(recipes), self.skew)
+        author_weights = zipf_weights(len(users), self.skew)
+        for through, count in (
+            (Recipe.favorites.through, options["favorites"]),
+            (Recipe.shopping_cart.through, options["carts"]),
+        ):
+            through.objects.bulk_create(
+                [through(user_id=user_id, recipe_id=recipe_id)
+                 for user_id, recipe_id in skewed_pairs(
+                     self.rng, users, recipes, count, recipe_weights)],
+                batch_size=self.batch_size,
+            )
+        Subscription.objects.bulk_create(
+            [Subscription(subscriber_id=subscriber, subscribed_to_id=author)
+             for subscriber, author in skewed_pairs(
+                 self.rng, users, users, options["subscriptions"],
+                 author_weights, exclude_self=True)],
+            batch_size=self.batch_size,
+        )
+
+    def refresh_denormalized(self, recipes):
+        """bulk_create не отправляет сигналы, счётчики считаются заново."""
+        recipes.update(
+            favorites_count=count_related(Recipe.favorites.through, "recipe"),
+            in_carts_count=count_related(
+                Recipe.shopping_cart.through, "recipe"),
+        )
+        User.objects.update(
+            recipes_count=count_related(Recipe, "author"),
+            followers_count=count_related(Subscription, "subscribed_to"),
+        )
+        recipes.update_search_vector()
+        ShoppingCartTotal.objects.rebuild()
+        TimelineEntry.objects.rebuild()
@@ -1,24 +1,284 @@
+import csv
 import json
+import os
+import re
+import time
+from collections import Counter
+from itertools import islice
 
-from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
 
-from recipe.models import Ingredient
+from recipe import cache
+from recipe.models import (Ingredient, IngredientRecipe, Recipe, Tag,
+                           TimelineEntry)
+
+User = get_user_model()
+
+READ_CHUNK_SIZE = 64 * 1024
+NON_SPACE = re.compile(r"\S")
+
+FORMATS = {
+    ".csv": "csv",
+    ".json": "json",
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+}
+
+CSV_FIELDS = {
+    "ingredients": ["name", "measurement_unit"],
+    "tags": ["name", "color", "slug"],
+}
+
+
+def iter_json_array(file):
+    """Элементы JSON-массива по одному, без загрузки файла целиком."""
+    decoder = json.JSONDecoder()
+    buffer, position, opened = "", 0, False
+    while True:
+        match = NON_SPACE.search(buffer, position)
+        if match is None:
+            buffer, position = file.read(READ_CHUNK_SIZE), 0
+            if not buffer:
+                raise CommandError("Unexpected end of JSON array")
+            continue
+        position = match.start()
+        char = buffer[position]
+        if not opened:
+            if char != "[":
+                raise CommandError("JSON file must contain an array")
+            opened, position = True, position + 1
+            continue
+        if char == "]":
+            return
+        if char == ",":
+            position += 1
+            continue
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = file.read(READ_CHUNK_SIZE)
+            if not chunk:
+                raise CommandError("Malformed JSON near the end of file")
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        yield item
+
+
+def iter_json_lines(file):
+    for number, line in enumerate(file, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as error:
+            raise CommandError(f"Line {number}: {error}")
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def import_ingredients(records):
+    """Новые ингредиенты; уже существующие пары пропускаются."""
+    Ingredient.objects.bulk_create(
+        [
+            Ingredient(
+                name=record["name"].strip(),
+                measurement_unit=record["measurement_unit"].strip(),
+            )
+            for record in records
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def import_tags(records):
+    """Теги по slug: новые создаются, у существующих обновляются поля."""
+    Tag.objects.bulk_create(
+        [
+            Tag(name=record["name"], color=record["color"],
+                slug=record["slug"])
+            for record in records
+        ],
+        update_conflicts=True,
+        unique_fields=["slug"],
+        update_fields=["name", "color"],
+    )
+
+
+def get_ingredient_ids(records):
+    """id ингредиентов рецептов, недостающие создаются."""
+    pairs = {
+        (item["name"].strip(), item["measurement_unit"].strip())
+        for record in records for item in record.get("ingredients", [])
+    }
+    Ingredient.objects.bulk_create(
+        [Ingredient(name=name, measurement_unit=unit)
+         for name, unit in pairs],
+        ignore_conflicts=True,
+    )
+    return {
+        (name, unit): pk
+        for pk, name, unit in Ingredient.objects.filter(
+            name__in={name for name, _ in pairs}
+        ).values_list("pk", "name", "measurement_unit")
+        if (name, unit) in pairs
+    }
+
+
+def import_recipes(records):
+    """Рецепты с тегами и ингредиентами, ключ — автор и название.
+
+    Рецепты, которые уже есть у автора, пропускаются, поэтому повторный
+    импорт того же файла ничего не дублирует.
+    """
+    usernames = {record["author"] for record in records}
+    authors = User.objects.in_bulk(usernames, field_name="username")
+    if missing := usernames - authors.keys():
+        raise CommandError(f"Unknown authors: {', '.join(sorted(missing))}")
+    slugs = {slug for record in records for slug in record.get("tags", [])}
+    tags = Tag.objects.in_bulk(slugs, field_name="slug")
+    if missing := slugs - tags.keys():
+        raise CommandError(f"Unknown tags: {', '.join(sorted(missing))}")
+
+    seen = set(Recipe.objects.filter(
+        author__in=authors.values(),
+        name__in={record["name"] for record in records},
+    ).values_list("author__username", "name"))
+    new_records = []
+    for record in records:
+        key = (record["author"], record["name"])
+        if key not in seen:
+            seen.add(key)
+            new_records.append(record)
+    if not new_records:
+        return
+    ingredient_ids = get_ingredient_ids(new_records)
+
+    recipes = Recipe.objects.bulk_create([
+        Recipe(
+            name=record["name"],
+            text=record["text"],
+            cooking_time=record["cooking_time"],
+            author=authors[record["author"]],
+        )
+        for record in new_records
+    ])
+    tag_links, amounts = [], Counter()
+    for recipe, record in zip(recipes, new_records):
+        tag_links.extend(
+            Recipe.tags.through(recipe_id=recipe.pk, tag_id=tags[slug].pk)
+            for slug in set(record.get("tags", []))
+        )
+        for item in record.get("ingredients", []):
+            key = (item["name"].strip(), item["measurement_unit"].strip())
+            amounts[recipe.pk, ingredient_ids[key]] += int(item["amount"])
+    Recipe.tags.through.objects.bulk_create(tag_links)
+    IngredientRecipe.objects.bulk_create([
+        IngredientRecipe(recipe_id=recipe_id, ingredient_id=ingredient_id,
+                         amount=amount)
+        for (recipe_id, ingredient_id), amount in amounts.items()
+    ])
+
+    # bulk_create не отправляет сигналы: вектор поиска, счётчики авторов
+    # и ленты подписчиков обновляются здесь.
+    Recipe.objects.filter(
+        pk__in=[recipe.pk for recipe in recipes]).update_search_vector()
+    for author_id, count in Counter(
+            recipe.author_id for recipe in recipes).items():
+        User.objects.filter(pk=author_id).update(
+            recipes_count=F("recipes_count") + count)
+    TimelineEntry.objects.fan_out(recipes)
+
+
+IMPORTERS = {
+    "ingredients": (Ingredient, import_ingredients, ("ingredients",)),
+    "tags": (Tag, import_tags, ("tags",)),
+    "recipes": (Recipe, import_recipes, ("ingredients", "recipes")),
+}
 
 
 class Command(BaseCommand):
-    help = "Imports JSON data into the database"
+    help = (
+        "Imports ingredients, tags or recipes from CSV, JSON or JSON Lines. "
+        "The file is streamed and written in batches, existing rows are "
+        "skipped or updated, so the import can be safely repeated"
+    )
 
     def add_arguments(self, parser):
+        parser.add_argument("path", type=str, help="Path to the data file")
         parser.add_argument(
-            "json_file", type=str, help="Path to the JSON file containing data"
+            "--model",
+            choices=sorted(IMPORTERS),
+            default="ingredients",
+            help="What the file contains (default: ingredients)",
         )
+        parser.add_argument(
+            "--format",
+            choices=sorted(set(FORMATS.values())),
+            help="File format, guessed from the extension by default",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Rows written per transaction (default: 5000)",
+        )
+        parser.add_argument(
+            "--header",
+            action="store_true",
+            help="The first CSV row contains column names",
+        )
+
+    def get_records(self, file, file_format, model, header):
+        if file_format == "json":
+            return iter_json_array(file)
+        if file_format == "jsonl":
+            return iter_json_lines(file)
+        if model not in CSV_FIELDS:
+            raise CommandError(f"CSV import is not supported for {model}")
+        return csv.DictReader(
+            file, fieldnames=None if header else CSV_FIELDS[model])
 
     def handle(self, *args, **options):
-        with open(options["json_file"], "r", encoding="utf-8") as file:
-            data = json.load(file)
-            for item in data:
-                Ingredient.objects.create(
-                    name=item["name"],
-                    measurement_unit=item["measurement_unit"]
-                )
-        self.stdout.write(self.style.SUCCESS("Successfully imported data"))
+        path, model = options["path"], options["model"]
+        file_format = options["format"] or FORMATS.get(
+            os.path.splitext(path)[1].lower())
+        if file_format is None:
+            raise CommandError("Cannot guess the file format, use --format")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive")
+        model_class, importer, cache_names = IMPORTERS[model]
+        count_before = model_class.objects.count()
+
+        started = time.monotonic()
+        processed = 0
+        with open(path, "r", encoding="utf-8", newline="") as file:
+            records = self.get_records(
+                file, file_format, model, options["header"])
+            for batch in batched(records, options["batch_size"]):
+                try:
+                    with transaction.atomic():
+                        importer(batch)
+                except (KeyError, TypeError, ValueError) as error:
+                    raise CommandError(
+                        f"Invalid record after row {processed}: {error!r}")
+                processed += len(batch)
+                elapsed = time.monotonic() - started
+                if options["verbosity"] > 0:
+                    self.stdout.write(
+                        f"{processed} rows, "
+                        f"{processed / max(elapsed, 1e-6):.0f} rows/s")
+        cache.invalidate(*cache_names)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {processed} {model} rows in {elapsed:.1f}s "
+            f"({processed / max(elapsed, 1e-6):.0f} rows/s), "
+            f"{model_class.objects.count() - count_before} new"))
@@ -0,0 +1,286 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework import serializers
+
+logger = logging.getLogger('foodgram.slow_requests')
+
+ROWS_WRITTEN_HEADER = 'X-Rows-Written'
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+METRICS = {
+    'foodgram_requests_total': (
+        'counter', 'Processed requests.'),
+    'foodgram_request_duration_seconds': (
+        'histogram', 'Request latency.'),
+    'foodgram_db_queries': (
+        'histogram', 'SQL queries per request.'),
+    'foodgram_db_query_seconds_total': (
+        'counter', 'Time spent in SQL queries.'),
+    'foodgram_serializer_seconds_total': (
+        'counter', 'Time spent serializing responses.'),
+    'foodgram_response_bytes': (
+        'histogram', 'Response body size.'),
+    'foodgram_db_rows_written_total': (
+        'counter', 'Rows written by recipe changes.'),
+}
+
+current_stats = ContextVar('request_stats', default=None)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def samples(self):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield '_bucket', {'le': str(bound)}, cumulative
+        yield '_bucket', {'le': '+Inf'}, self.count
+        yield '_sum', {}, self.sum
+        yield '_count', {}, self.count
+
+
+class Registry:
+    """Метрики процесса: счётчики и гистограммы с метками."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = defaultdict(float)
+        self.histograms = {}
+
+    def inc(self, name, labels, value=1):
+        with self.lock:
+            self.counters[name, labels] += value
+
+    def observe(self, name, labels, value, buckets):
+        with self.lock:
+            histogram = self.histograms.get((name, labels))
+            if histogram is None:
+                histogram = self.histograms[name, labels] = Histogram(
+                    buckets)
+            histogram.observe(value)
+
+    def render(self):
+        """Текстовый формат Prometheus 0.0.4."""
+        samples = defaultdict(list)
+        with self.lock:
+            for (name, labels), value in self.counters.items():
+                samples[name].append(('', dict(labels), value))
+            for (name, labels), histogram in self.histograms.items():
+                samples[name].extend(
+                    (suffix, {**dict(labels), **extra}, value)
+                    for suffix, extra, value in histogram.samples())
+        lines = []
+        for name, (kind, help_text) in METRICS.items():
+            if name not in samples:
+                continue
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for suffix, labels, value in samples[name]:
+                label_text = ','.join(
+                    f'{key}="{escape(label)}"'
+                    for key, label in labels.items())
+                lines.append(
+                    f'{name}{suffix}{{{label_text}}} {float(value)!r}')
+        return '\n'.join(lines) + '\n'
+
+
+def escape(value):
+    return str(value).replace(
+        '\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+registry = Registry()
+
+
+class RequestStats:
+    def __init__(self, collect_sql):
+        self.collect_sql = collect_sql
+        self.queries = 0
+        self.query_time = 0
+        self.statements = []
+        self.serializer_time = 0
+        self.serializing = False
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.queries += 1
+            self.query_time += duration
+            if self.collect_sql:
+                self.statements.append((duration, sql))
+
+
+def record_query(execute, sql, params, many, context):
+    """Учитывает SQL-запрос в статистике текущего HTTP-запроса."""
+    stats = current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    return stats(execute, sql, params, many, context)
+
+
+def instrument_connection(connection, **kwargs):
+    # Соединения привязаны к потоку, а под ASGI ORM работает не в потоке
+    # middleware, поэтому обёртка ставится на каждое соединение.
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+def timed_data(prop):
+    """Время сериализации учитывается только у внешнего сериализатора."""
+
+    def data(self):
+        stats = current_stats.get()
+        if stats is None or stats.serializing:
+            return prop.fget(self)
+        stats.serializing = True
+        started = time.perf_counter()
+        try:
+            return prop.fget(self)
+        finally:
+            stats.serializer_time += time.perf_counter() - started
+            stats.serializing = False
+
+    data.instrumented = True
+    return property(data)
+
+
+def instrument_serializers():
+    for serializer_class in (serializers.Serializer,
+                             serializers.ListSerializer):
+        prop = serializer_class.__dict__['data']
+        if not getattr(prop.fget, 'instrumented', False):
+            serializer_class.data = timed_data(prop)
+
+
+def get_view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    view_class = getattr(match.func, 'cls', None)
+    actions = getattr(match.func, 'actions', None)
+    if view_class is not None and actions:
+        action = actions.get(request.method.lower(), request.method.lower())
+        return f'{view_class.__name__}.{action}'
+    if view_class is not None:
+        return view_class.__name__
+    return match.view_name or 'unmatched'
+
+
+class MetricsMiddleware:
+    """Задержка, SQL-запросы, сериализация и размер ответа по view.
+
+    Метрики хранятся в памяти процесса и отдаются на /api/metrics/.
+    Запросы дольше METRICS_SLOW_REQUEST_MS пишутся в лог вместе с самыми
+    долгими и самыми частыми SQL-запросами.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_threshold = settings.METRICS_SLOW_REQUEST_MS / 1000
+        instrument_serializers()
+        connection_created.connect(
+            instrument_connection, dispatch_uid='metrics')
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    @contextmanager
+    def track(self):
+        stats = RequestStats(collect_sql=self.slow_threshold > 0)
+        for connection in connections.all(initialized_only=True):
+            instrument_connection(connection)
+        token = current_stats.set(stats)
+        try:
+            yield stats
+        finally:
+            current_stats.reset(token)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        with self.track() as stats:
+            response = self.get_response(request)
+        self.record(request, response, stats, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        with self.track() as stats:
+            response = await self.get_response(request)
+        self.record(request, response, stats, time.perf_counter() - started)
+        return response
+
+    def record(self, request, response, stats, duration):
+        labels = (('view', get_view_name(request)),
+                  ('method', request.method))
+        registry.inc('foodgram_requests_total',
+                     labels + (('status', response.status_code),))
+        registry.observe('foodgram_request_duration_seconds', labels,
+                         duration, LATENCY_BUCKETS)
+        registry.observe('foodgram_db_queries', labels, stats.queries,
+                         QUERY_COUNT_BUCKETS)
+        registry.inc('foodgram_db_query_seconds_total', labels,
+                     stats.query_time)
+        registry.inc('foodgram_serializer_seconds_total', labels,
+                     stats.serializer_time)
+        if not response.streaming:
+            registry.observe('foodgram_response_bytes', labels,
+                             len(response.content), SIZE_BUCKETS)
+        rows_written = response.get(ROWS_WRITTEN_HEADER)
+        if rows_written:
+            registry.inc('foodgram_db_rows_written_total', labels,
+                         int(rows_written))
+        if self.slow_threshold and duration >= self.slow_threshold:
+            self.log_slow_request(request, stats, duration, labels)
+
+    def log_slow_request(self, request, stats, duration, labels):
+        slowest = sorted(stats.statements, reverse=True)[:5]
+        repeated = Counter(sql for _, sql in stats.statements).most_common(1)
+        lines = [
+            f'Slow request {request.method} {request.get_full_path()} '
+            f'({dict(labels)["view"]}): {duration * 1000:.0f} ms, '
+            f'{stats.queries} queries in {stats.query_time * 1000:.0f} ms, '
+            f'serializer {stats.serializer_time * 1000:.0f} ms'
+        ]
+        lines.extend(
+            f'  {query_time * 1000:.1f} ms: {sql}'
+            for query_time, sql in slowest)
+        if repeated and repeated[0][1] > 1:
+            sql, count = repeated[0]
+            lines.append(f'  repeated {count} times: {sql}')
+        logger.warning('\n'.join(lines))
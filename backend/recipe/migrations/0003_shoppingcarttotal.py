@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, Sum
+
+
+def fill_cart_totals(apps, schema_editor):
+    Recipe = apps.get_model('recipe', 'Recipe')
+    ShoppingCartTotal = apps.get_model('recipe', 'ShoppingCartTotal')
+    rows = Recipe.shopping_cart.through.objects.values(
+        'user_id', ingredient_id=F('recipe__recipes__ingredient')
+    ).annotate(
+        amount=Sum('recipe__recipes__amount')
+    ).filter(ingredient_id__isnull=False)
+    ShoppingCartTotal.objects.bulk_create(
+        (ShoppingCartTotal(**row) for row in rows.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0002_alter_tag_color'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingCartTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.PositiveIntegerField(verbose_name='Количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cart_totals', to='recipe.ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cart_totals', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Итог списка покупок',
+                'verbose_name_plural': 'Итоги списков покупок',
+                'constraints': [models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_cart_total')],
+            },
+        ),
+        migrations.RunPython(fill_cart_totals, migrations.RunPython.noop),
+    ]
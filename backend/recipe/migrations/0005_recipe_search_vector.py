@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:53
+
+import django.contrib.postgres.search
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import OuterRef, Subquery, TextField, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS recipe_search_idx '
+        'ON recipe_recipe USING gin (search_vector)'
+    )
+    Recipe = apps.get_model('recipe', 'Recipe')
+    IngredientRecipe = apps.get_model('recipe', 'IngredientRecipe')
+    ingredient_names = IngredientRecipe.objects.filter(
+        recipe=OuterRef('pk')
+    ).values('recipe').annotate(
+        names=StringAgg('ingredient__name', ' ')
+    ).values('names')
+    Recipe.objects.update(search_vector=(
+        SearchVector('name', weight='A', config='russian')
+        + SearchVector('text', weight='B', config='russian')
+        + SearchVector(
+            Coalesce(Subquery(ingredient_names), Value(''),
+                     output_field=TextField()),
+            weight='C',
+            config='russian',
+        )
+    ))
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS recipe_search_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0004_ingredient_name_trgm'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(fill_search_vector, drop_search_index),
+    ]
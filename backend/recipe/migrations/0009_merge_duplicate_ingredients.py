@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:59
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_rows(model, group_field, keep_id, duplicate_ids):
+    """Переносит строки на оставшийся ингредиент, суммируя совпадения."""
+    kept = {
+        getattr(row, group_field + '_id'): row
+        for row in model.objects.filter(ingredient_id=keep_id)
+    }
+    for row in model.objects.filter(ingredient_id__in=duplicate_ids):
+        target = kept.get(getattr(row, group_field + '_id'))
+        if target is None:
+            row.ingredient_id = keep_id
+            row.save(update_fields=['ingredient'])
+            kept[getattr(row, group_field + '_id')] = row
+        else:
+            target.amount += row.amount
+            target.save(update_fields=['amount'])
+            row.delete()
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('recipe', 'Ingredient')
+    IngredientRecipe = apps.get_model('recipe', 'IngredientRecipe')
+    ShoppingCartTotal = apps.get_model('recipe', 'ShoppingCartTotal')
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(keep_id=Min('id'), total=Count('id')).filter(total__gt=1)
+    for group in duplicates:
+        duplicate_ids = list(Ingredient.objects.filter(
+            name=group['name'],
+            measurement_unit=group['measurement_unit'],
+        ).exclude(id=group['keep_id']).values_list('id', flat=True))
+        merge_rows(IngredientRecipe, 'recipe', group['keep_id'],
+                   duplicate_ids)
+        merge_rows(ShoppingCartTotal, 'user', group['keep_id'],
+                   duplicate_ids)
+        Ingredient.objects.filter(id__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0008_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_ingredients,
+                             migrations.RunPython.noop),
+    ]
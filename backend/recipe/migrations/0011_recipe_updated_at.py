@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:14
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_updated_at(apps, schema_editor):
+    Recipe = apps.get_model('recipe', 'Recipe')
+    Recipe.objects.update(updated_at=F('pub_date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0010_unique_ingredient'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата изменения рецепта'),
+        ),
+        migrations.RunPython(fill_updated_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Q
+
+
+def fill_timelines(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    Subscription = apps.get_model('recipe', 'Subscription')
+    TimelineEntry = apps.get_model('recipe', 'TimelineEntry')
+    User.objects.update(
+        feed_pull=Q(followers_count__gt=settings.FEED_FANOUT_LIMIT))
+    rows = Subscription.objects.filter(
+        subscribed_to__feed_pull=False,
+        subscribed_to__recipes__isnull=False,
+    ).values_list(
+        'subscriber_id', 'subscribed_to_id',
+        'subscribed_to__recipes', 'subscribed_to__recipes__pub_date',
+    )
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, author_id=author_id,
+                          recipe_id=recipe_id, pub_date=pub_date)
+            for user_id, author_id, recipe_id, pub_date in rows.iterator()
+        ),
+        batch_size=1000,
+    )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0011_recipe_updated_at'),
+        ('users', '0004_user_feed_pull'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата публикации рецепта')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='recipe.recipe', verbose_name='Рецепт')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL, verbose_name='Подписчик')),
+            ],
+            options={
+                'verbose_name': 'запись ленты',
+                'verbose_name_plural': 'Записи лент',
+                'indexes': [models.Index(fields=['user', '-pub_date', '-recipe'], name='timeline_user_pub_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'recipe'), name='unique_timeline_entry')],
+            },
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
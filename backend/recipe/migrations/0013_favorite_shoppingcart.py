@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0012_timelineentry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Модели связей занимают таблицы автоматических M2M: меняется
+        # только состояние, схема и данные остаются прежними.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='Favorite',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='recipe.recipe', verbose_name='Рецепт')),
+                        ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                    ],
+                    options={
+                        'verbose_name': 'избранный рецепт',
+                        'verbose_name_plural': 'Избранное',
+                        'db_table': 'recipe_recipe_favorites',
+                        'unique_together': {('recipe', 'user')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='recipe',
+                    name='favorites',
+                    field=models.ManyToManyField(blank=True, related_name='favorite_recipes', through='recipe.Favorite', to=settings.AUTH_USER_MODEL),
+                ),
+                migrations.CreateModel(
+                    name='ShoppingCart',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='recipe.recipe', verbose_name='Рецепт')),
+                        ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                    ],
+                    options={
+                        'verbose_name': 'рецепт в списке покупок',
+                        'verbose_name_plural': 'Списки покупок',
+                        'db_table': 'recipe_recipe_shopping_cart',
+                        'unique_together': {('recipe', 'user')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='recipe',
+                    name='shopping_cart',
+                    field=models.ManyToManyField(blank=True, related_name='shoping_recipes', through='recipe.ShoppingCart', to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date', '-id'], name='recipe_author_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['user', 'recipe'], name='favorite_user_recipe_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shoppingcart',
+            index=models.Index(fields=['user', 'recipe'], name='cart_user_recipe_idx'),
+        ),
+    ]
@@ -1,11 +1,219 @@
-from .models import Subscription
+import hashlib
+from functools import cached_property, partial
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import HttpResponse
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date
+from rest_framework.permissions import SAFE_METHODS
+
+from . import cache, replicas
+from .models import Recipe, Subscription
+from .renderers import FastJSONRenderer
+
+
+def get_sparse_fields(request):
+    """Имена полей из ?fields=a,b или None, если ответ полный."""
+    if request is None or request.method not in SAFE_METHODS:
+        return None
+    value = request.query_params.get("fields")
+    if not value:
+        return None
+    return {name.strip() for name in value.split(",")}
 
 
 class IsSubscribedMixin:
     def get_is_subscribed(self, obj):
+        if hasattr(obj, "is_subscribed"):
+            return obj.is_subscribed
         user = self.context["request"].user
         if user.is_authenticated:
             return Subscription.objects.filter(
                 subscriber=user, subscribed_to=obj
             ).exists()
         return False
+
+
+class SparseFieldsMixin:
+    """Оставляет в ответе только поля, перечисленные в ?fields=.
+
+    Действует на сериализатор самого представления, вложенные
+    сериализаторы (например, автор рецепта) отдаются целиком.
+    """
+
+    @cached_property
+    def sparse_fields(self):
+        view = self.context.get("view")
+        if view is None or not isinstance(self, view.get_serializer_class()):
+            return None
+        return get_sparse_fields(self.context.get("request"))
+
+    def is_requested(self, name):
+        return self.sparse_fields is None or name in self.sparse_fields
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.sparse_fields is None:
+            return fields
+        return {
+            name: field for name, field in fields.items()
+            if name in self.sparse_fields
+        }
+
+
+class ImageVariantsMixin:
+    """Ссылки на уменьшенные копии изображения рецепта."""
+
+    def build_image_url(self, path):
+        url = default_storage.url(path)
+        request = self.context.get("request")
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+    def get_image_variants(self, obj):
+        return {
+            image_format: {
+                width: self.build_image_url(path)
+                for width, path in paths.items()
+            }
+            for image_format, paths in obj.image_variants.items()
+        }
+
+    def get_thumbnail(self, obj):
+        jpeg = obj.image_variants.get("jpeg")
+        if jpeg:
+            return self.build_image_url(jpeg[min(jpeg, key=int)])
+        if obj.image:
+            return self.build_image_url(obj.image.name)
+        return None
+
+
+class CachedListMixin:
+    """Список справочника без параметров отдаётся из кэша с ETag."""
+
+    cache_name = None
+
+    def render_cached_list(self):
+        # Кэш живёт до следующего изменения, отставшая реплика не годится.
+        with replicas.primary():
+            serializer = self.get_serializer(self.get_queryset(), many=True)
+            return FastJSONRenderer().render(serializer.data)
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params:
+            return super().list(request, *args, **kwargs)
+        version = cache.get_version(self.cache_name)
+        etag = cache.get_etag(self.cache_name, version)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(
+                cache.get_or_build(
+                    self.cache_name, version, self.render_cached_list),
+                content_type='application/json',
+            )
+        response['ETag'] = etag
+        patch_cache_control(response, no_cache=True)
+        return response
+
+
+def get_user_state(user):
+    """Версии избранного, корзины и подписок пользователя."""
+    if not user.is_authenticated:
+        return "anonymous"
+    return (f"{user.pk}.{user.favorites_version}.{user.cart_version}."
+            f"{user.subscriptions_version}")
+
+
+class ConditionalRecipeMixin:
+    """ETag и Last-Modified для списка и карточки рецепта.
+
+    Валидатор карточки собирается из дат изменения рецепта и автора,
+    списка — из версии рецептов в общем кэше; к обоим добавляются версии
+    справочников и списков пользователя, поэтому на совпавший
+    If-None-Match ответ 304 отдаётся без сериализации.
+    """
+
+    def get_etag(self, *parts):
+        parts = (
+            *parts,
+            cache.get_version("tags"),
+            cache.get_version("ingredients"),
+            get_user_state(self.request.user),
+        )
+        digest = hashlib.md5(
+            ":".join(map(str, parts)).encode(), usedforsecurity=False)
+        return f'W/"{digest.hexdigest()}"'
+
+    def get_conditional(self, request, etag, last_modified, render,
+                        max_age=None):
+        timestamp = self.get_timestamp(request, last_modified)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = render()
+        return self.patch_conditional(
+            request, response, etag, timestamp, max_age)
+
+    def get_timestamp(self, request, last_modified):
+        # Last-Modified не учитывает списки пользователя, поэтому
+        # отдаётся только анонимам.
+        if request.user.is_authenticated or last_modified is None:
+            return None
+        return int(last_modified.timestamp())
+
+    def patch_conditional(self, request, response, etag, timestamp,
+                          max_age=None):
+        if response.status_code not in (200, 304):
+            return response
+        anonymous = not request.user.is_authenticated
+        response["ETag"] = etag
+        if timestamp is not None:
+            response["Last-Modified"] = http_date(timestamp)
+        if anonymous and max_age:
+            patch_cache_control(response, public=True, max_age=max_age)
+        elif anonymous:
+            patch_cache_control(response, no_cache=True)
+        else:
+            patch_cache_control(response, no_cache=True, private=True)
+        patch_vary_headers(response, ("Authorization",))
+        return response
+
+    def get_detail_state(self, pk):
+        return Recipe.objects.filter(pk=pk).values_list(
+            "updated_at", "author__updated_at")
+
+    def get_detail_validators(self, pk, state):
+        fields = self.request.query_params.get("fields", "")
+        return self.get_etag("recipe", pk, fields, *state), max(state)
+
+    def get_list_validators(self, request):
+        """ETag списка по версиям рецептов вместо агрегатов по выборке."""
+        parts = [cache.get_version("recipes")]
+        # Счётчики в ответе не выводятся и влияют только на сортировку.
+        ordering = request.query_params.get("ordering", "")
+        if "favorites_count" in ordering or "in_carts_count" in ordering:
+            parts.append(cache.get_version("recipe_counters"))
+        return self.get_etag(
+            "recipes", request.get_full_path(), *parts), None
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        render = partial(super().retrieve, request, *args, **kwargs)
+        try:
+            state = self.get_detail_state(pk).first()
+        except (TypeError, ValueError):
+            state = None
+        if state is None:
+            return render()
+        return self.get_conditional(
+            request, *self.get_detail_validators(pk, state), render)
+
+    def list(self, request, *args, **kwargs):
+        return self.get_conditional(
+            request, *self.get_list_validators(request),
+            partial(super().list, request, *args, **kwargs),
+            max_age=settings.RECIPE_LIST_MAX_AGE,
+        )
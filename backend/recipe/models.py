@@ -1,17 +1,29 @@
+from collections import defaultdict
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from colorfield.fields import ColorField
 
 User = get_user_model()
 
+RECIPE_SEARCH_CONFIG = "russian"
+
 
 class Ingredient(models.Model):
     name = models.CharField("Название", max_length=128)
     measurement_unit = models.CharField("Единица измерения", max_length=12)
 
     class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["name", "measurement_unit"],
+                                    name="unique_ingredient")
+        ]
         verbose_name = "ингредиент"
         verbose_name_plural = "Ингредиенты"
 
@@ -32,6 +44,75 @@ class Tag(models.Model):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+    def with_user_flags(self, user):
+        """Флаги избранного, корзины и подписки на автора через Exists."""
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=models.Value(False),
+                is_in_shopping_cart=models.Value(False),
+                author_is_subscribed=models.Value(False),
+            )
+        return self.annotate(
+            is_favorited=models.Exists(
+                Recipe.favorites.through.objects.filter(
+                    recipe=models.OuterRef("pk"), user=user)
+            ),
+            is_in_shopping_cart=models.Exists(
+                Recipe.shopping_cart.through.objects.filter(
+                    recipe=models.OuterRef("pk"), user=user)
+            ),
+            author_is_subscribed=models.Exists(
+                Subscription.objects.filter(
+                    subscriber=user, subscribed_to=models.OuterRef("author"))
+            ),
+        )
+
+    def with_related(self, fields=None):
+        """Автор, теги и ингредиенты за постоянное число запросов.
+
+        fields — поля разреженного ответа: связи, которых в нём нет,
+        не загружаются.
+        """
+        queryset = self
+        if fields is None or "author" in fields:
+            queryset = queryset.select_related("author")
+        if fields is None or "tags" in fields:
+            queryset = queryset.prefetch_related("tags")
+        if fields is None or "ingredients" in fields:
+            queryset = queryset.prefetch_related(models.Prefetch(
+                "recipes",
+                queryset=IngredientRecipe.objects.select_related(
+                    "ingredient"),
+            ))
+        return queryset
+
+    def update_search_vector(self):
+        """Пересчитывает вектор поиска по названию, описанию и ингредиентам.
+
+        Вектор хранится только на PostgreSQL, на остальных базах поиск
+        обходится без него.
+        """
+        if connection.vendor != "postgresql":
+            return
+        ingredient_names = IngredientRecipe.objects.filter(
+            recipe=models.OuterRef("pk")
+        ).values("recipe").annotate(
+            names=StringAgg("ingredient__name", " ")
+        ).values("names")
+        self.update(search_vector=(
+            SearchVector("name", weight="A", config=RECIPE_SEARCH_CONFIG)
+            + SearchVector("text", weight="B", config=RECIPE_SEARCH_CONFIG)
+            + SearchVector(
+                Coalesce(models.Subquery(ingredient_names),
+                         models.Value(""),
+                         output_field=models.TextField()),
+                weight="C",
+                config=RECIPE_SEARCH_CONFIG,
+            )
+        ))
+
+
 class Recipe(models.Model):
     name = models.CharField("Название", max_length=128)
     text = models.TextField("Описание")
@@ -51,23 +132,49 @@ class Recipe(models.Model):
     image = models.ImageField(upload_to="recipes/images/",
                               null=True,
                               default=None)
+    image_variants = models.JSONField(
+        "Варианты изображения", default=dict, blank=True, editable=False
+    )
     ingredients = models.ManyToManyField(
         Ingredient, through="IngredientRecipe", verbose_name="Ингредиент"
     )
     tags = models.ManyToManyField(Tag, verbose_name="тег")
     favorites = models.ManyToManyField(
-        User, related_name="favorite_recipes", blank=True
+        User, through="Favorite", related_name="favorite_recipes", blank=True
     )
     shopping_cart = models.ManyToManyField(
-        User, related_name="shoping_recipes", blank=True
+        User, through="ShoppingCart", related_name="shoping_recipes",
+        blank=True
     )
     pub_date = models.DateTimeField(
         verbose_name='Дата публикации рецепта',
         auto_now_add=True,
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения рецепта',
+        auto_now=True,
+    )
+    search_vector = SearchVectorField(null=True, editable=False)
+    favorites_count = models.PositiveIntegerField(
+        "В избранном", default=0, editable=False
+    )
+    in_carts_count = models.PositiveIntegerField(
+        "В списках покупок", default=0, editable=False
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(fields=["-favorites_count"],
+                         name="recipe_favorites_count_idx"),
+            models.Index(fields=["-pub_date", "-id"],
+                         name="recipe_pub_date_id_idx"),
+            # Рецепты автора по дате: фильтр author и лента.
+            models.Index(fields=["author", "-pub_date", "-id"],
+                         name="recipe_author_pub_date_idx"),
+        ]
         verbose_name = "рецепт"
         verbose_name_plural = "Рецепты"
 
@@ -75,6 +182,59 @@ class Recipe(models.Model):
         return self.name
 
 
+class Favorite(models.Model):
+    """Рецепт в избранном пользователя."""
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name="Рецепт",
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name="Пользователь",
+    )
+
+    class Meta:
+        # Таблица прежней автоматической связи, данные не переносятся.
+        db_table = "recipe_recipe_favorites"
+        unique_together = [("recipe", "user")]
+        indexes = [
+            # Списки пользователя читаются по индексу без обращения
+            # к таблице, (recipe, user) покрывает флаги рецепта.
+            models.Index(fields=["user", "recipe"],
+                         name="favorite_user_recipe_idx"),
+        ]
+        verbose_name = "избранный рецепт"
+        verbose_name_plural = "Избранное"
+
+
+class ShoppingCart(models.Model):
+    """Рецепт в списке покупок пользователя."""
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name="Рецепт",
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name="Пользователь",
+    )
+
+    class Meta:
+        db_table = "recipe_recipe_shopping_cart"
+        unique_together = [("recipe", "user")]
+        indexes = [
+            models.Index(fields=["user", "recipe"],
+                         name="cart_user_recipe_idx"),
+        ]
+        verbose_name = "рецепт в списке покупок"
+        verbose_name_plural = "Списки покупок"
+
+
 class IngredientRecipe(models.Model):
     recipe = models.ForeignKey(
         Recipe,
@@ -137,3 +297,238 @@ class Subscription(models.Model):
             f"{self.subscriber.username} is subscribed"
             f"to {self.subscribed_to.username}"
         )
+
+
+class ShoppingCartTotalQuerySet(models.QuerySet):
+    def cart_deltas(self, cart_rows, sign=1):
+        """Суммы ингредиентов по строкам корзины (user, recipe)."""
+        rows = cart_rows.values(
+            "user_id", ingredient_id=models.F("recipe__recipes__ingredient")
+        ).annotate(
+            amount=models.Sum("recipe__recipes__amount")
+        ).filter(ingredient_id__isnull=False)
+        return {
+            (row["user_id"], row["ingredient_id"]): sign * row["amount"]
+            for row in rows
+        }
+
+    def apply_deltas(self, deltas):
+        """Прибавляет изменения к итогам, обнуленные строки удаляет."""
+        deltas = {key: delta for key, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        user_ids = {user_id for user_id, _ in deltas}
+        ingredient_ids = {ingredient_id for _, ingredient_id in deltas}
+        with transaction.atomic():
+            list(User.objects.select_for_update().filter(pk__in=user_ids))
+            existing = {
+                (total.user_id, total.ingredient_id): total
+                for total in self.filter(
+                    user_id__in=user_ids, ingredient_id__in=ingredient_ids)
+            }
+            to_create, to_update, to_delete = [], [], []
+            for (user_id, ingredient_id), delta in deltas.items():
+                total = existing.get((user_id, ingredient_id))
+                if total is None:
+                    to_create.append(self.model(
+                        user_id=user_id,
+                        ingredient_id=ingredient_id,
+                        amount=delta,
+                    ))
+                    continue
+                total.amount += delta
+                if total.amount > 0:
+                    to_update.append(total)
+                else:
+                    to_delete.append(total.pk)
+            self.bulk_create(to_create)
+            self.bulk_update(to_update, ["amount"])
+            self.filter(pk__in=to_delete).delete()
+
+    def apply_recipe_deltas(self, recipe, amount_deltas):
+        """Изменения количеств ингредиентов рецепта во всех корзинах."""
+        user_ids = Recipe.shopping_cart.through.objects.filter(
+            recipe=recipe).values_list("user_id", flat=True)
+        self.apply_deltas({
+            (user_id, ingredient_id): delta
+            for user_id in user_ids
+            for ingredient_id, delta in amount_deltas.items()
+        })
+
+    def rebuild(self):
+        cart_rows = Recipe.shopping_cart.through.objects.all()
+        with transaction.atomic():
+            self.all().delete()
+            self.bulk_create(
+                (
+                    self.model(
+                        user_id=user_id,
+                        ingredient_id=ingredient_id,
+                        amount=amount,
+                    )
+                    for (user_id, ingredient_id), amount
+                    in self.cart_deltas(cart_rows).items()
+                ),
+                batch_size=1000,
+            )
+
+
+class ShoppingCartTotal(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="cart_totals",
+        verbose_name="Пользователь",
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name="cart_totals",
+        verbose_name="Ингредиент",
+    )
+    amount = models.PositiveIntegerField("Количество")
+
+    objects = ShoppingCartTotalQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "ingredient"],
+                                    name="unique_cart_total")
+        ]
+        verbose_name = "Итог списка покупок"
+        verbose_name_plural = "Итоги списков покупок"
+
+    def __str__(self):
+        return f"{self.user} — {self.ingredient}: {self.amount}"
+
+
+class TimelineQuerySet(models.QuerySet):
+    def fan_out(self, recipes):
+        """Раскладывает новые рецепты по лентам подписчиков их авторов.
+
+        Автор с числом подписчиков больше FEED_FANOUT_LIMIT получает
+        feed_pull, и его рецепты подмешиваются в ленту при чтении.
+        """
+        by_author = defaultdict(list)
+        for recipe in recipes:
+            by_author[recipe.author_id].append(recipe)
+        User.objects.filter(
+            pk__in=by_author, feed_pull=False,
+            followers_count__gt=settings.FEED_FANOUT_LIMIT,
+        ).update(feed_pull=True)
+        followers = Subscription.objects.filter(
+            subscribed_to__in=by_author, subscribed_to__feed_pull=False,
+        ).values_list("subscribed_to_id", "subscriber_id")
+        self.bulk_create(
+            (
+                self.model(user_id=user_id, recipe=recipe,
+                           author_id=author_id, pub_date=recipe.pub_date)
+                for author_id, user_id in followers.iterator()
+                for recipe in by_author[author_id]
+            ),
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+
+    def follow(self, subscription):
+        """Последние рецепты автора в ленту нового подписчика."""
+        recipes = Recipe.objects.filter(
+            author=subscription.subscribed_to_id, author__feed_pull=False
+        ).order_by("-pub_date", "-id")[:settings.FEED_BACKFILL_SIZE]
+        self.bulk_create(
+            [self.model(user_id=subscription.subscriber_id, recipe_id=pk,
+                        author_id=subscription.subscribed_to_id,
+                        pub_date=pub_date)
+             for pk, pub_date in recipes.values_list("pk", "pub_date")],
+            ignore_conflicts=True,
+        )
+
+    def unfollow(self, subscription):
+        self.filter(user=subscription.subscriber_id,
+                    author=subscription.subscribed_to_id).delete()
+
+    def page(self, user, position, size):
+        """id рецептов ленты после позиции курсора (pub_date, id).
+
+        Страница собирается из двух выборок по индексу: записей ленты
+        пользователя и рецептов популярных авторов из его подписок.
+        """
+        sources = [(self.filter(user=user), "recipe_id")]
+        pulled = list(Subscription.objects.filter(
+            subscriber=user, subscribed_to__feed_pull=True
+        ).values_list("subscribed_to", flat=True))
+        if pulled:
+            sources.append((Recipe.objects.filter(author__in=pulled), "id"))
+        keys = set()
+        for queryset, pk_field in sources:
+            if position is not None:
+                pub_date, pk = position
+                queryset = queryset.filter(
+                    models.Q(pub_date__lt=pub_date)
+                    | models.Q(pub_date=pub_date, **{f"{pk_field}__lt": pk}))
+            keys.update(queryset.order_by(
+                "-pub_date", f"-{pk_field}"
+            ).values_list("pub_date", pk_field)[:size])
+        return [pk for _, pk in sorted(keys, reverse=True)[:size]]
+
+    def rebuild(self):
+        """Заново раскладывает все рецепты по лентам подписчиков."""
+        rows = Subscription.objects.filter(
+            subscribed_to__feed_pull=False,
+            subscribed_to__recipes__isnull=False,
+        ).values_list(
+            "subscriber_id", "subscribed_to_id",
+            "subscribed_to__recipes", "subscribed_to__recipes__pub_date",
+        )
+        with transaction.atomic():
+            self.all().delete()
+            User.objects.update(feed_pull=models.Q(
+                followers_count__gt=settings.FEED_FANOUT_LIMIT))
+            self.bulk_create(
+                (
+                    self.model(user_id=user_id, author_id=author_id,
+                               recipe_id=recipe_id, pub_date=pub_date)
+                    for user_id, author_id, recipe_id, pub_date
+                    in rows.iterator()
+                ),
+                batch_size=1000,
+            )
+
+
+class TimelineEntry(models.Model):
+    """Рецепт в ленте подписчика, записывается при публикации."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="timeline",
+        verbose_name="Подписчик",
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name="timeline_entries",
+        verbose_name="Рецепт",
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Автор",
+    )
+    # Копия даты рецепта: страница ленты читается одним проходом индекса.
+    pub_date = models.DateTimeField("Дата публикации рецепта")
+
+    objects = TimelineQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "recipe"],
+                                    name="unique_timeline_entry")
+        ]
+        indexes = [
+            models.Index(fields=["user", "-pub_date", "-recipe"],
+                         name="timeline_user_pub_date_idx"),
+        ]
+        verbose_name = "запись ленты"
+        verbose_name_plural = "Записи лент"
@@ -1,6 +1,162 @@
+import base64
+import binascii
+import json
+
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def parse_cursor_id(value):
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError(value)
+    return value
 
 
 class CustomPagination(PageNumberPagination):
+    """Постраничная пагинация с опциональным keyset-режимом.
+
+    Запрос с параметром cursor (в том числе пустым для первой страницы)
+    переключает пагинацию на курсор по keyset_ordering представления:
+    без OFFSET и без COUNT(*), ответ содержит только next и results.
+    """
+
     page_size_query_param = 'limit'
     page_size = 6
+    cursor_query_param = 'cursor'
+    keyset_ordering = ('-pub_date', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+    cursor_ordering_message = (
+        'Cursor pagination does not support ordering or search, '
+        'use page-based pagination instead')
+    # Разбор значений курсора по полям keyset: None или ошибка
+    # разбора означает поддельный курсор.
+    cursor_parsers = {'pub_date': parse_datetime, 'id': parse_cursor_id}
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+        return self.get_keyset_page(
+            list(self.get_keyset_queryset(queryset, request, view)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset для async-представлений через async ORM."""
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        if self.cursor_mode:
+            queryset = self.get_keyset_queryset(queryset, request, view)
+            return self.get_keyset_page([item async for item in queryset])
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        paginator = self.django_paginator_class(queryset, page_size)
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message=str(exc)))
+        self.page.object_list = [
+            item async for item in self.page.object_list]
+        return list(self.page)
+
+    def start_keyset(self, request, fields):
+        """Включает курсорный режим и возвращает позицию курсора."""
+        self.cursor_mode = True
+        self.request = request
+        self.keyset_page_size = self.get_page_size(request)
+        self.keyset_fields = list(fields)
+        return self.decode_cursor(request)
+
+    def get_keyset_queryset(self, queryset, request, view):
+        """Срез на страницу и одну запись сверх неё после курсора."""
+        ordering = getattr(view, 'keyset_ordering', self.keyset_ordering)
+        # ?ordering= и поиск задают свой порядок, курсор по keyset его
+        # молча заменил бы; совпадающий с keyset порядок допустим.
+        active = tuple(queryset.query.order_by)
+        if active != tuple(ordering[:len(active)]):
+            raise ValidationError(
+                {self.cursor_query_param: [self.cursor_ordering_message]})
+        position = self.start_keyset(
+            request, [field.lstrip('-') for field in ordering])
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            descending = ordering[0].startswith('-')
+            queryset = queryset.filter(
+                self.keyset_filter(position, descending))
+        return queryset[:self.keyset_page_size + 1]
+
+    def get_keyset_page(self, page):
+        self.next_position = None
+        if len(page) > self.keyset_page_size:
+            page = page[:self.keyset_page_size]
+            self.next_position = [
+                getattr(page[-1], field) for field in self.keyset_fields]
+        return page
+
+    def keyset_filter(self, position, descending):
+        """(a, b) < (x, y) в виде a < x OR (a = x AND b < y)."""
+        lookup = 'lt' if descending else 'gt'
+        condition = Q()
+        for index, field in enumerate(self.keyset_fields):
+            equal = {
+                name: value for name, value
+                in zip(self.keyset_fields[:index], position)
+            }
+            condition |= Q(
+                **equal, **{f'{field}__{lookup}': position[index]})
+        return condition
+
+    def encode_cursor(self, position):
+        values = [
+            value.isoformat() if hasattr(value, 'isoformat') else value
+            for value in position
+        ]
+        return base64.urlsafe_b64encode(
+            json.dumps(values).encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if (not isinstance(position, list)
+                or len(position) != len(self.keyset_fields)):
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            position = [
+                self.cursor_parsers[field](value)
+                for field, value in zip(self.keyset_fields, position)
+            ]
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if None in position:
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def get_next_cursor_link(self):
+        if self.next_position is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.next_position),
+        )
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_cursor_link(),
+            'results': data,
+        })
@@ -0,0 +1,24 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer на orjson, без него работает как обычный.
+
+    Ответ с отступами для Browsable API и типы, которых orjson не
+    знает (ленивые строки, Decimal), обрабатываются средствами DRF.
+    Числовые ключи словарей, как и в json, становятся строками.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or self.get_indent(
+                accepted_media_type, renderer_context or {})):
+            return super().render(
+                data, accepted_media_type, renderer_context)
+        return orjson.dumps(
+            data, default=self.encoder_class().default,
+            option=orjson.OPT_NON_STR_KEYS)
@@ -0,0 +1,145 @@
+import hashlib
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from rest_framework.authtoken.models import Token
+from rest_framework.permissions import SAFE_METHODS
+
+STICKY_KEY = 'db:sticky:{}'
+
+logger = logging.getLogger('foodgram.replicas')
+
+read_alias = ContextVar('read_alias', default=None)
+# Реплика -> время, до которого она считается недоступной.
+unavailable = {}
+
+
+def get_replicas():
+    return [alias for alias in connections if alias != DEFAULT_DB_ALIAS]
+
+
+@contextmanager
+def primary():
+    """Чтение внутри блока идёт в основную базу."""
+    token = read_alias.set(None)
+    try:
+        yield
+    finally:
+        read_alias.reset(token)
+
+
+def get_sticky_key(request):
+    header = request.META.get('HTTP_AUTHORIZATION')
+    if not header:
+        return None
+    digest = hashlib.md5(header.encode(), usedforsecurity=False)
+    return STICKY_KEY.format(digest.hexdigest())
+
+
+def choose_replica():
+    """Случайная доступная реплика или None, если живых нет."""
+    now = time.monotonic()
+    replicas = [alias for alias in get_replicas()
+                if unavailable.get(alias, 0) <= now]
+    random.shuffle(replicas)
+    for alias in replicas:
+        try:
+            connections[alias].ensure_connection()
+        except DatabaseError:
+            logger.warning('Replica %s is unavailable for %s s', alias,
+                           settings.REPLICA_RETRY_SECONDS, exc_info=True)
+            unavailable[alias] = now + settings.REPLICA_RETRY_SECONDS
+            continue
+        return alias
+    return None
+
+
+class ReplicaMiddleware:
+    """Отправляет чтение выбранных view на реплики.
+
+    На реплику идут только безопасные запросы к действиям из
+    replica_actions класса view. После изменяющего запроса клиент на
+    REPLICA_STICKY_SECONDS читает из основной базы, чтобы сразу видеть
+    свои изменения.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not get_replicas():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = read_alias.set(None)
+        try:
+            response = self.get_response(request)
+        finally:
+            read_alias.reset(token)
+        self.stick(request)
+        return response
+
+    async def __acall__(self, request):
+        token = read_alias.set(None)
+        try:
+            response = await self.get_response(request)
+        finally:
+            read_alias.reset(token)
+        self.stick(request)
+        return response
+
+    def stick(self, request):
+        if request.method not in SAFE_METHODS:
+            key = get_sticky_key(request)
+            if key is not None:
+                cache.set(key, True, timeout=settings.REPLICA_STICKY_SECONDS)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in SAFE_METHODS:
+            return None
+        view_class = getattr(view_func, 'cls', None)
+        actions = getattr(view_func, 'actions', None) or {}
+        action = actions.get(request.method.lower())
+        if action not in getattr(view_class, 'replica_actions', ()):
+            return None
+        key = get_sticky_key(request)
+        if key is not None and cache.get(key):
+            return None
+        alias = choose_replica()
+        if alias is not None:
+            read_alias.set(alias)
+        return None
+
+
+class ReplicaRouter:
+    """Запись и миграции в основной базе, чтение по выбору middleware."""
+
+    def db_for_read(self, model, **hints):
+        alias = read_alias.get()
+        if alias is None or model is Token:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
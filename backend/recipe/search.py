@@ -0,0 +1,137 @@
+from django.conf import settings
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            TrigramSimilarity)
+from django.db import connection
+from django.db.models import (Case, Count, Exists, F, IntegerField, OuterRef,
+                              Q, Value, When)
+from django.db.models.functions import Upper
+
+from .models import RECIPE_SEARCH_CONFIG, IngredientRecipe
+
+TRIGRAM_MIN_LENGTH = 3
+TRIGRAM_THRESHOLD = 0.3
+
+PREFIX, SUBSTRING, SIMILAR = range(3)
+
+
+def trigrams(value):
+    """Триграммы в духе pg_trgm: по словам, с пробелами по краям."""
+    result = set()
+    for word in value.split():
+        padded = f'  {word} '
+        result.update(
+            padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+def similarity(first, second):
+    first, second = trigrams(first), trigrams(second)
+    if not first or not second:
+        return 0
+    return len(first & second) / len(first | second)
+
+
+def search_postgres(queryset, query, limit):
+    query = query.upper()
+    matches = Q(name_upper__contains=query)
+    if len(query) >= TRIGRAM_MIN_LENGTH:
+        matches |= Q(name_upper__trigram_similar=query)
+    return queryset.annotate(
+        name_upper=Upper('name'),
+    ).filter(matches).annotate(
+        match_rank=Case(
+            When(name_upper__startswith=query, then=Value(PREFIX)),
+            When(name_upper__contains=query, then=Value(SUBSTRING)),
+            default=Value(SIMILAR),
+            output_field=IntegerField(),
+        ),
+        similarity=TrigramSimilarity('name_upper', query),
+    ).order_by('match_rank', '-similarity', 'name')[:limit]
+
+
+def search_python(queryset, query, limit):
+    query = query.casefold()
+    ranked = []
+    for pk, name in queryset.values_list('pk', 'name').iterator():
+        folded = name.casefold()
+        if folded.startswith(query):
+            ranked.append((PREFIX, 0, folded, pk))
+        elif query in folded:
+            ranked.append((SUBSTRING, 0, folded, pk))
+        elif len(query) >= TRIGRAM_MIN_LENGTH:
+            score = similarity(folded, query)
+            if score >= TRIGRAM_THRESHOLD:
+                ranked.append((SIMILAR, -score, folded, pk))
+    ids = [pk for *_, pk in sorted(ranked)[:limit]]
+    if not ids:
+        return queryset.none()
+    return queryset.filter(pk__in=ids).order_by(Case(
+        *(When(pk=pk, then=Value(position))
+          for position, pk in enumerate(ids)),
+        output_field=IntegerField(),
+    ))
+
+
+def search_ingredients(queryset, query, limit=None):
+    """Префиксные совпадения, затем подстроки, затем похожие по триграммам.
+
+    На PostgreSQL поиск обслуживает GIN-индекс по UPPER(name) с
+    gin_trgm_ops, на остальных базах совпадения считаются в Python.
+    """
+    query = query.strip()
+    if not query:
+        return queryset
+    if limit is None:
+        limit = settings.INGREDIENT_SEARCH_LIMIT
+    if connection.vendor == 'postgresql':
+        return search_postgres(queryset, query, limit)
+    return search_python(queryset, query, limit)
+
+
+def search_recipes(queryset, query):
+    """Рецепты по релевантности: название, затем описание и ингредиенты.
+
+    На PostgreSQL используется сохранённый search_vector с GIN-индексом,
+    на остальных базах — icontains с тем же порядком весов.
+    """
+    query = query.strip()
+    if not query:
+        return queryset
+    if connection.vendor == 'postgresql':
+        search_query = SearchQuery(
+            query, config=RECIPE_SEARCH_CONFIG, search_type='websearch')
+        return queryset.filter(search_vector=search_query).annotate(
+            rank=SearchRank(F('search_vector'), search_query),
+        ).order_by('-rank', '-pub_date')
+    ingredient_match = Exists(IngredientRecipe.objects.filter(
+        recipe=OuterRef('pk'), ingredient__name__icontains=query))
+    return queryset.annotate(
+        ingredient_match=ingredient_match,
+    ).filter(
+        Q(name__icontains=query)
+        | Q(text__icontains=query)
+        | Q(ingredient_match=True)
+    ).annotate(
+        rank=Case(
+            When(name__icontains=query, then=Value(0)),
+            When(text__icontains=query, then=Value(1)),
+            default=Value(2),
+            output_field=IntegerField(),
+        ),
+    ).order_by('rank', '-pub_date')
+
+
+def with_all_ingredients(queryset, ingredient_ids):
+    """Рецепты, в которых есть все перечисленные ингредиенты.
+
+    Одна группировка по индексу ingredient_id вместо join на каждый id.
+    """
+    ingredient_ids = set(ingredient_ids)
+    if not ingredient_ids:
+        return queryset
+    recipe_ids = IngredientRecipe.objects.filter(
+        ingredient_id__in=ingredient_ids
+    ).values('recipe').annotate(
+        matched=Count('ingredient')
+    ).filter(matched=len(ingredient_ids)).values('recipe')
+    return queryset.filter(pk__in=recipe_ids)
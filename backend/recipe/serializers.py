@@ -1,21 +1,33 @@
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from djoser.serializers import UserSerializer
 from rest_framework import serializers
 from rest_framework.relations import SlugRelatedField
 
-from .models import Ingredient, IngredientRecipe, Recipe, Tag
+from .models import (Ingredient, IngredientRecipe, Recipe, ShoppingCartTotal,
+                     Tag)
 from .fields import Base64ImageField
-from .mixins import IsSubscribedMixin
+from .images import schedule_variants
+from .mixins import ImageVariantsMixin, IsSubscribedMixin, SparseFieldsMixin
 
 User = get_user_model()
 
+BULK_IDS_LIMIT = 500
 
-class SimplifiedRecipeSerializer(serializers.ModelSerializer):
+
+class SimplifiedRecipeSerializer(serializers.ModelSerializer,
+                                 ImageVariantsMixin):
     image = Base64ImageField()
+    thumbnail = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
-        fields = ("id", "name", "image", "cooking_time")
+        fields = ("id", "name", "image", "thumbnail", "cooking_time")
+
+
+class TopRecipeSerializer(SimplifiedRecipeSerializer):
+    class Meta(SimplifiedRecipeSerializer.Meta):
+        fields = SimplifiedRecipeSerializer.Meta.fields + ("favorites_count",)
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -51,7 +63,43 @@ class IngredientRecipeSerializer(serializers.ModelSerializer):
         fields = ("id", "name", "measurement_unit", "amount")
 
 
-class UserSerializer(UserSerializer, IsSubscribedMixin):
+class ShoppingCartTotalSerializer(serializers.ModelSerializer):
+    name = serializers.CharField(source="ingredient.name", read_only=True)
+    measurement_unit = serializers.CharField(
+        source="ingredient.measurement_unit", read_only=True
+    )
+    id = serializers.IntegerField(source="ingredient.id", read_only=True)
+
+    class Meta:
+        model = ShoppingCartTotal
+        fields = ("id", "name", "measurement_unit", "amount")
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Тело пакетного добавления и удаления рецептов из списков."""
+
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        max_length=BULK_IDS_LIMIT, required=False)
+    all = serializers.BooleanField(default=False)
+
+    def validate(self, data):
+        method = self.context["request"].method
+        if data["all"] and method != "DELETE":
+            raise serializers.ValidationError(
+                {"all": "Очистить список можно только запросом DELETE."})
+        if data["all"] and "recipes" in data:
+            raise serializers.ValidationError(
+                "Укажите либо recipes, либо all.")
+        if not data["all"] and not data.get("recipes"):
+            raise serializers.ValidationError(
+                {"recipes": "Нужен хотя бы один рецепт."})
+        # Повторы не меняют результат, порядок ответа как в запросе.
+        data["recipes"] = list(dict.fromkeys(data.get("recipes", ())))
+        return data
+
+
+class UserSerializer(SparseFieldsMixin, UserSerializer, IsSubscribedMixin):
 
     is_subscribed = serializers.SerializerMethodField()
 
@@ -67,12 +115,17 @@ class UserSerializer(UserSerializer, IsSubscribedMixin):
         )
 
 
-class RecipeSerializer(serializers.ModelSerializer):
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True, queryset=Tag.objects.all(), required=True
+class RecipeSerializer(SparseFieldsMixin, serializers.ModelSerializer,
+                       ImageVariantsMixin):
+    tags = serializers.ListField(
+        child=serializers.IntegerField(), required=True, write_only=True
+    )
+    ingredients = IngredientSerializer(
+        many=True, required=True, write_only=True
     )
-    ingredients = IngredientSerializer(many=True, required=True)
     image = Base64ImageField(required=True)
+    image_variants = serializers.SerializerMethodField()
+    thumbnail = serializers.SerializerMethodField()
     author = SlugRelatedField(
         read_only=True,
         slug_field="username",
@@ -82,7 +135,15 @@ class RecipeSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Recipe
-        exclude = ["favorites", "shopping_cart", "pub_date"]
+        exclude = [
+            "favorites",
+            "shopping_cart",
+            "pub_date",
+            "search_vector",
+            "favorites_count",
+            "in_carts_count",
+            "updated_at",
+        ]
 
     def validate(self, data):
         request = self.context.get("request")
@@ -102,14 +163,6 @@ class RecipeSerializer(serializers.ModelSerializer):
             )
 
         for ingredient_data in ingredients:
-            ingredient_id = ingredient_data.get("id")
-            try:
-                Ingredient.objects.get(id=ingredient_id)
-            except Ingredient.DoesNotExist:
-                raise serializers.ValidationError(
-                    {"ingredient": f"Ингр с ID {ingredient_id} не существует."}
-                )
-
             amount = ingredient_data.get("amount", 0)
             if amount < 1:
                 raise serializers.ValidationError(
@@ -122,97 +175,188 @@ class RecipeSerializer(serializers.ModelSerializer):
                 {"ingredient": "Ингредиенты должны быть уникальными!"}
             )
 
+        found = Ingredient.objects.in_bulk(ingredient_ids)
+        missing = [str(pk) for pk in ingredient_ids if pk not in found]
+        if missing:
+            raise serializers.ValidationError(
+                {"ingredient": "Ингредиенты с ID {} не существуют.".format(
+                    ", ".join(missing))}
+            )
+        for ingredient_data in ingredients:
+            ingredient_data["ingredient"] = found[ingredient_data["id"]]
+
         return ingredients
 
-    def validate_tags(self, tags):
-        if not tags:
+    def validate_tags(self, tag_ids):
+        if not tag_ids:
             raise serializers.ValidationError(
                 "Необходимо указать хотя бы один тэг."
             )
 
-        for tag_data in tags:
-            tag_id = tag_data.id
-            try:
-                Tag.objects.get(id=tag_id)
-            except Tag.DoesNotExist:
-                raise serializers.ValidationError(
-                    {"tag": f"Тэг с ID {tag_id} не существует."}
-                )
-
-        tag_ids = [data.id for data in tags]
         if len(tag_ids) != len(set(tag_ids)):
             raise serializers.ValidationError(
                 {"tag": "Тэги должны быть уникальными!"}
             )
 
-        return tags
+        found = Tag.objects.in_bulk(tag_ids)
+        missing = [str(pk) for pk in tag_ids if pk not in found]
+        if missing:
+            raise serializers.ValidationError(
+                {"tag": "Тэги с ID {} не существуют.".format(
+                    ", ".join(missing))}
+            )
+
+        return [found[pk] for pk in tag_ids]
 
     def to_representation(self, instance):
         representation = super(
             RecipeSerializer, self).to_representation(instance)
-        representation["author"] = UserSerializer(
-            instance.author, context=self.context
-        ).data
-
-        representation["tags"] = TagSerializer(
-            instance.tags.all(), many=True
-        ).data
-
-        ingredients = instance.recipes.all()
-        representation["ingredients"] = IngredientRecipeSerializer(
-            ingredients, many=True
-        ).data
+        if self.is_requested("author"):
+            if hasattr(instance, "author_is_subscribed"):
+                instance.author.is_subscribed = instance.author_is_subscribed
+            representation["author"] = UserSerializer(
+                instance.author, context=self.context
+            ).data
+
+        # После записи теги и ингредиенты берутся из уже проверенных
+        # объектов, без повторных запросов.
+        if self.is_requested("tags"):
+            tags = getattr(instance, "saved_tags", None)
+            if tags is None:
+                tags = instance.tags.all()
+            representation["tags"] = TagSerializer(tags, many=True).data
+
+        if self.is_requested("ingredients"):
+            ingredients = getattr(instance, "saved_ingredients", None)
+            if ingredients is None:
+                ingredients = instance.recipes.all()
+            representation["ingredients"] = IngredientRecipeSerializer(
+                ingredients, many=True
+            ).data
 
         return representation
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, "is_favorited"):
+            return obj.is_favorited
         user = self.context["request"].user
         if user.is_authenticated:
             return obj.favorites.filter(id=user.id).exists()
         return False
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, "is_in_shopping_cart"):
+            return obj.is_in_shopping_cart
         user = self.context["request"].user
         if user.is_authenticated:
             return obj.shopping_cart.filter(id=user.id).exists()
         return False
 
-    def process_ingredients(self, instance, ingredients_data):
-        instance.recipes.all().delete()
-        ingredient_recipes = [
-            IngredientRecipe(
-                recipe=instance,
-                ingredient_id=ingredient_data["id"],
-                amount=ingredient_data["amount"]
-            ) for ingredient_data in ingredients_data
-        ]
-        IngredientRecipe.objects.bulk_create(ingredient_recipes)
+    def write_tags(self, instance, tags, current_ids=()):
+        """Добавляет и удаляет только изменившиеся теги."""
+        current_ids = set(current_ids)
+        new_ids = {tag.pk for tag in tags}
+        removed = current_ids - new_ids
+        added = [tag for tag in tags if tag.pk not in current_ids]
+        if removed:
+            instance.tags.remove(*removed)
+        if added:
+            instance.tags.add(*added)
+        instance.saved_tags = tags
+        return len(removed) + len(added)
+
+    def write_ingredients(self, instance, ingredients_data, existing=None):
+        """Пишет разницу между текущими и новыми ингредиентами рецепта.
+
+        Новые строки вставляются, изменившиеся количества обновляются
+        через bulk_update, лишние удаляются. Итоги корзин получают только
+        изменения количеств, existing=None означает новый рецепт.
+        Возвращает число затронутых строк и признак того, что изменился
+        состав ингредиентов.
+        """
+        current = {row.ingredient_id: row for row in existing or ()}
+        rows, to_create, to_update, amount_deltas = [], [], [], {}
+        for ingredient_data in ingredients_data:
+            ingredient = ingredient_data["ingredient"]
+            amount = ingredient_data["amount"]
+            row = current.pop(ingredient.pk, None)
+            if row is None:
+                row = IngredientRecipe(
+                    recipe=instance, ingredient=ingredient, amount=amount)
+                to_create.append(row)
+                amount_deltas[ingredient.pk] = amount
+            elif row.amount != amount:
+                amount_deltas[ingredient.pk] = amount - row.amount
+                row.amount = amount
+                to_update.append(row)
+            row.ingredient = ingredient
+            rows.append(row)
+        for ingredient_id, row in current.items():
+            amount_deltas[ingredient_id] = -row.amount
+        instance.saved_ingredients = rows
+        if not amount_deltas:
+            return 0, False
+
+        IngredientRecipe.objects.bulk_create(to_create)
+        IngredientRecipe.objects.bulk_update(to_update, ["amount"])
+        IngredientRecipe.objects.filter(
+            pk__in=[row.pk for row in current.values()]).delete()
+        if existing is not None:
+            ShoppingCartTotal.objects.apply_recipe_deltas(
+                instance, amount_deltas)
+        return len(amount_deltas), bool(to_create or current)
 
     def create(self, validated_data):
-        tags_data = validated_data.pop("tags", [])
+        tags = validated_data.pop("tags", [])
         ingredients_data = validated_data.pop("ingredients", [])
-        recipe = Recipe.objects.create(**validated_data)
-        recipe.tags.set(tags_data)
-        self.process_ingredients(recipe, ingredients_data)
+        with transaction.atomic():
+            recipe = Recipe.objects.create(**validated_data)
+            tag_rows = self.write_tags(recipe, tags)
+            ingredient_rows, _ = self.write_ingredients(
+                recipe, ingredients_data)
+            Recipe.objects.filter(pk=recipe.pk).update_search_vector()
+        self.rows_written = 1 + tag_rows + ingredient_rows
+        schedule_variants(recipe)
         return recipe
 
     def update(self, instance, validated_data):
-        tags_data = validated_data.pop("tags", [])
-        ingredients_data = validated_data.pop("ingredients", [])
-        instance = super().update(instance, validated_data)
-        if tags_data:
-            instance.tags.set(tags_data)
-        self.process_ingredients(instance, ingredients_data)
+        tags = validated_data.pop("tags", None)
+        ingredients_data = validated_data.pop("ingredients", None)
+        changed = [
+            field for field, value in validated_data.items()
+            if getattr(instance, field) != value
+        ]
+        rows_written = 0
+        with transaction.atomic():
+            for field in changed:
+                setattr(instance, field, validated_data[field])
+            if tags is not None:
+                rows_written += self.write_tags(
+                    instance, tags,
+                    instance.tags.values_list("id", flat=True))
+            ingredients_changed = False
+            if ingredients_data is not None:
+                ingredient_rows, ingredients_changed = self.write_ingredients(
+                    instance, ingredients_data, list(instance.recipes.all()))
+                rows_written += ingredient_rows
+            # updated_at меняется и тогда, когда изменились только теги или
+            # ингредиенты: по нему строится ETag рецепта.
+            if changed or rows_written:
+                instance.save(update_fields=[*changed, "updated_at"])
+                rows_written += 1
+            if ingredients_changed or {"name", "text"} & set(changed):
+                Recipe.objects.filter(
+                    pk=instance.pk).update_search_vector()
+        self.rows_written = rows_written
+        if "image" in changed:
+            schedule_variants(instance)
         return instance
 
 
 class UserSubscriptionSerializer(serializers.ModelSerializer,
                                  IsSubscribedMixin):
-    recipes = SimplifiedRecipeSerializer(many=True, read_only=True)
-    recipes_count = serializers.IntegerField(
-        source="recipes.count",
-        read_only=True
-    )
+    recipes = serializers.SerializerMethodField()
+    recipes_count = serializers.IntegerField(read_only=True)
     is_subscribed = serializers.SerializerMethodField()
 
     class Meta:
@@ -228,17 +372,14 @@ class UserSubscriptionSerializer(serializers.ModelSerializer,
             "recipes_count",
         ]
 
-    def to_representation(self, instance):
-        representation = super(
-            UserSubscriptionSerializer,
-            self).to_representation(instance)
-        request = self.context.get("request")
-        recipes_limit = request.query_params.get("recipes_limit")
-
-        if recipes_limit and recipes_limit.isdigit():
-            recipes_limit = int(recipes_limit)
-            representation["recipes"] = (
-                representation["recipes"][:recipes_limit]
-            )
-
-        return representation
+    def get_recipes(self, obj):
+        recipes = getattr(obj, "limited_recipes", None)
+        if recipes is None:
+            recipes = obj.recipes.all()
+            request = self.context.get("request")
+            recipes_limit = request.query_params.get("recipes_limit")
+            if recipes_limit and recipes_limit.isdigit():
+                recipes = recipes[:int(recipes_limit)]
+        return SimplifiedRecipeSerializer(
+            recipes, many=True, context=self.context
+        ).data
@@ -0,0 +1,101 @@
+import csv
+import io
+import json
+import os
+
+from django.conf import settings
+from rest_framework.negotiation import DefaultContentNegotiation
+
+HEADER = ['Ingredient', 'Total Amount', 'Measurement Unit']
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'txt': 'text/plain; charset=utf-8',
+    'json': 'application/json',
+    'pdf': 'application/pdf',
+}
+
+
+class ShoppingListNegotiation(DefaultContentNegotiation):
+    """Не даёт DRF трактовать ?format= как выбор рендерера."""
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def row_values(ingredient):
+    return (
+        ingredient['ingredient__name'],
+        ingredient['total_amount'],
+        ingredient['ingredient__measurement_unit'],
+    )
+
+
+def stream_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(HEADER)
+    for ingredient in ingredients:
+        yield writer.writerow(row_values(ingredient))
+
+
+def stream_txt(ingredients):
+    yield 'Список покупок\n\n'
+    for ingredient in ingredients:
+        name, amount, unit = row_values(ingredient)
+        yield f'{name} ({unit}) — {amount}\n'
+
+
+def stream_json(ingredients):
+    yield '['
+    separator = ''
+    for ingredient in ingredients:
+        name, amount, unit = row_values(ingredient)
+        yield separator + json.dumps(
+            {'name': name, 'amount': amount, 'measurement_unit': unit},
+            ensure_ascii=False,
+        )
+        separator = ','
+    yield ']'
+
+
+def render_pdf(ingredients):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+
+    font = 'Helvetica'
+    if os.path.exists(settings.SHOPPING_LIST_PDF_FONT):
+        font = 'ShoppingListFont'
+        pdfmetrics.registerFont(
+            TTFont(font, settings.SHOPPING_LIST_PDF_FONT))
+
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    _, height = A4
+    y = height - 50
+    pdf.setFont(font, 16)
+    pdf.drawString(50, y, 'Список покупок')
+    pdf.setFont(font, 12)
+    for ingredient in ingredients:
+        y -= 20
+        if y < 50:
+            pdf.showPage()
+            pdf.setFont(font, 12)
+            y = height - 50
+        name, amount, unit = row_values(ingredient)
+        pdf.drawString(50, y, f'{name} ({unit}) — {amount}')
+    pdf.save()
+    return buffer.getvalue()
+
+
+STREAMERS = {
+    'csv': stream_csv,
+    'txt': stream_txt,
+    'json': stream_json,
+}
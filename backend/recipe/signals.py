@@ -0,0 +1,191 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from . import cache
+from .authentication import token_cache
+from .expressions import count_related
+from .models import (Favorite, Ingredient, Recipe, ShoppingCart,
+                     ShoppingCartTotal, Subscription, Tag, TimelineEntry,
+                     User)
+
+
+def invalidate_on_commit(*names):
+    """Новая версия видна только вместе с закоммиченными данными."""
+    transaction.on_commit(lambda: cache.invalidate(*names))
+
+
+@receiver([post_save, post_delete], sender=Tag)
+def invalidate_tags_cache(sender, **kwargs):
+    invalidate_on_commit("tags")
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def invalidate_ingredients_cache(sender, **kwargs):
+    invalidate_on_commit("ingredients")
+
+
+def forget_users(user_ids):
+    # После коммита, иначе параллельный запрос успеет положить в кэш
+    # пользователя со старыми версиями из незакоммиченного состояния.
+    transaction.on_commit(lambda: token_cache.delete_users(user_ids))
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+def invalidate_recipes_cache(sender, **kwargs):
+    invalidate_on_commit("recipes")
+
+
+@receiver(post_save, sender=User)
+def invalidate_authors_cache(sender, update_fields=None, **kwargs):
+    # Вход пользователя меняет только last_login, которого нет в ответах.
+    if update_fields is None or set(update_fields) != {"last_login"}:
+        invalidate_on_commit("recipes")
+
+
+@receiver(post_save, sender=Ingredient)
+def update_recipe_search_vectors(sender, instance, created, **kwargs):
+    if not created:
+        Recipe.objects.filter(ingredients=instance).update_search_vector()
+
+
+# Знак изменения для действий m2m_changed, при которых строки связи
+# еще (pre_*) или уже (post_add) есть в таблице.
+ROW_ACTIONS = {"post_add": 1, "pre_remove": -1, "pre_clear": -1}
+
+
+def changed_rows(sender, instance, reverse, action, pk_set):
+    """Строки связи рецепта и пользователя, затронутые m2m_changed."""
+    rows = sender.objects.filter(
+        **{"user" if reverse else "recipe": instance})
+    if action != "pre_clear":
+        rows = rows.filter(
+            **{"recipe__in" if reverse else "user__in": pk_set})
+    return rows
+
+
+def update_recipe_counter(counter, rows, sign):
+    """Сдвигает счетчик рецептов на число их строк связи."""
+    if Recipe.objects.filter(pk__in=rows.values("recipe")).update(**{
+            counter: F(counter) + sign * count_related(
+                rows.model, "recipe", rows)}):
+        invalidate_on_commit("recipe_counters")
+
+
+def bump_user_version(field, rows):
+    """Увеличивает версию пользователей из строк связи."""
+    user_ids = list(rows.values_list("user_id", flat=True).distinct())
+    if user_ids:
+        User.objects.filter(pk__in=user_ids).update(**{field: F(field) + 1})
+        forget_users(user_ids)
+
+
+@receiver(m2m_changed, sender=Favorite)
+def favorites_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ROW_ACTIONS:
+        return
+    rows = changed_rows(sender, instance, reverse, action, pk_set)
+    update_recipe_counter("favorites_count", rows, ROW_ACTIONS[action])
+    bump_user_version("favorites_version", rows)
+
+
+@receiver(m2m_changed, sender=ShoppingCart)
+def shopping_cart_changed(sender, instance, action, reverse, pk_set,
+                          **kwargs):
+    if action not in ROW_ACTIONS:
+        return
+    rows = changed_rows(sender, instance, reverse, action, pk_set)
+    ShoppingCartTotal.objects.apply_deltas(
+        ShoppingCartTotal.objects.cart_deltas(rows, ROW_ACTIONS[action]))
+    update_recipe_counter("in_carts_count", rows, ROW_ACTIONS[action])
+    bump_user_version("cart_version", rows)
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_recipe_from_cart_totals(sender, instance, **kwargs):
+    ShoppingCartTotal.objects.apply_deltas(
+        ShoppingCartTotal.objects.cart_deltas(
+            ShoppingCart.objects.filter(recipe=instance), -1))
+
+
+@receiver(pre_delete, sender=Recipe)
+def bump_versions_of_deleted_recipe(sender, instance, **kwargs):
+    # Каскадное удаление связей не отправляет m2m_changed.
+    bump_user_version(
+        "favorites_version", Favorite.objects.filter(recipe=instance))
+    bump_user_version(
+        "cart_version", ShoppingCart.objects.filter(recipe=instance))
+
+
+@receiver(pre_delete, sender=User)
+def remove_user_from_recipe_counters(sender, instance, **kwargs):
+    # Связи удалённого пользователя тоже удаляются без m2m_changed.
+    update_recipe_counter(
+        "favorites_count", Favorite.objects.filter(user=instance), -1)
+    update_recipe_counter(
+        "in_carts_count", ShoppingCart.objects.filter(user=instance), -1)
+
+
+@receiver([post_save, post_delete], sender=Subscription)
+def bump_subscriptions_version(sender, instance, **kwargs):
+    User.objects.filter(pk=instance.subscriber_id).update(
+        subscriptions_version=F("subscriptions_version") + 1)
+    forget_users([instance.subscriber_id])
+
+
+@receiver([post_save, post_delete], sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    forget_users([instance.pk])
+
+
+@receiver(post_delete, sender=Token)
+def forget_cached_token(sender, instance, **kwargs):
+    # После удаления Django обнуляет первичный ключ, то есть key токена.
+    key = instance.key
+    transaction.on_commit(lambda: token_cache.delete_keys([key]))
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(sender, instance, created, **kwargs):
+    if created:
+        User.objects.filter(pk=instance.author_id).update(
+            recipes_count=F("recipes_count") + 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(sender, instance, **kwargs):
+    User.objects.filter(pk=instance.author_id).update(
+        recipes_count=F("recipes_count") - 1)
+
+
+@receiver(post_save, sender=Subscription)
+def increment_followers_count(sender, instance, created, **kwargs):
+    if created:
+        User.objects.filter(pk=instance.subscribed_to_id).update(
+            followers_count=F("followers_count") + 1)
+
+
+@receiver(post_delete, sender=Subscription)
+def decrement_followers_count(sender, instance, **kwargs):
+    User.objects.filter(pk=instance.subscribed_to_id).update(
+        followers_count=F("followers_count") - 1)
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(sender, instance, created, **kwargs):
+    if created:
+        TimelineEntry.objects.fan_out([instance])
+
+
+@receiver(post_save, sender=Subscription)
+def fill_timeline(sender, instance, created, **kwargs):
+    if created:
+        TimelineEntry.objects.follow(instance)
+
+
+@receiver(post_delete, sender=Subscription)
+def clear_timeline(sender, instance, **kwargs):
+    TimelineEntry.objects.unfollow(instance)
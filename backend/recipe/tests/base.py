@@ -0,0 +1,102 @@
+import base64
+import json
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipe.models import (Ingredient, IngredientRecipe, Recipe,
+                           Subscription, Tag)
+
+User = get_user_model()
+
+IMAGE = (
+    "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAA"
+    "DUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=="
+)
+
+
+def create_recipe(author, name, amounts, tags=()):
+    """Рецепт без загрузки изображения: amounts — {ингредиент: количество}."""
+    recipe = Recipe.objects.create(
+        author=author, name=name, text="Описание", cooking_time=10,
+        image="recipes/images/test.png")
+    IngredientRecipe.objects.bulk_create([
+        IngredientRecipe(recipe=recipe, ingredient=ingredient, amount=amount)
+        for ingredient, amount in amounts.items()
+    ])
+    recipe.tags.set(tags)
+    return recipe
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+class FoodgramTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username="author", email="author@example.com",
+            first_name="Автор", last_name="Первый", password="password")
+        cls.other_author = User.objects.create_user(
+            username="other", email="other@example.com",
+            first_name="Автор", last_name="Второй", password="password")
+        cls.reader = User.objects.create_user(
+            username="reader", email="reader@example.com",
+            first_name="Читатель", last_name="Первый", password="password")
+        cls.breakfast = Tag.objects.create(
+            name="Завтрак", color="#E26C2D", slug="breakfast")
+        cls.dinner = Tag.objects.create(
+            name="Ужин", color="#8775D2", slug="dinner")
+        cls.ingredients = [
+            Ingredient.objects.create(name=f"Ингредиент {number}",
+                                      measurement_unit="г")
+            for number in range(4)
+        ]
+        Subscription.objects.create(
+            subscriber=cls.reader, subscribed_to=cls.author)
+        Subscription.objects.create(
+            subscriber=cls.reader, subscribed_to=cls.other_author)
+        first, second, third, fourth = cls.ingredients
+        cls.recipes = [
+            create_recipe(
+                author, f"Рецепт {number}",
+                {first: 100 + number, (second, third, fourth)[number % 3]: 5},
+                (cls.breakfast, cls.dinner) if number % 2
+                else (cls.breakfast,),
+            )
+            for number, author in enumerate(
+                [cls.author] * 4 + [cls.other_author] * 3)
+        ]
+        for recipe in cls.recipes[:3]:
+            recipe.favorites.add(cls.reader)
+        for recipe in cls.recipes[2:5]:
+            recipe.shopping_cart.add(cls.reader)
+
+    def setUp(self):
+        cache.clear()
+        self.anonymous = APIClient()
+        self.client = self.get_client(self.reader)
+        self.author_client = self.get_client(self.author)
+
+    def get_client(self, user):
+        # Токен, а не force_authenticate: версии списков пользователя
+        # должны читаться из базы, как в настоящем запросе.
+        token, _ = Token.objects.get_or_create(user=user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        return client
+
+    def use_temporary_media(self):
+        """Загрузки теста пишутся во временный MEDIA_ROOT."""
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings = self.settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        return media_root
@@ -0,0 +1,51 @@
+from asgiref.sync import sync_to_async
+from django.test import AsyncClient
+from rest_framework.authtoken.models import Token
+
+from .base import FoodgramTestCase
+
+
+class AsyncViewsTests(FoodgramTestCase):
+    """Под ASGI чтение идёт в async-представления с тем же ответом."""
+
+    def get_urls(self):
+        recipe = self.recipes[2]
+        return [
+            "/api/recipes/",
+            "/api/recipes/?limit=2&tags=dinner",
+            f"/api/recipes/?author={self.author.pk}&cursor=",
+            "/api/recipes/?is_in_shopping_cart=1",
+            f"/api/recipes/{recipe.pk}/",
+            f"/api/recipes/{recipe.pk}/?fields=id,name",
+            "/api/recipes/0/",
+            "/api/tags/",
+            f"/api/tags/{self.dinner.pk}/",
+            "/api/ingredients/",
+            "/api/ingredients/?name=Ингредиент",
+        ]
+
+    async def assert_same(self, sync_client, headers):
+        # Заголовки конструктора AsyncClient не попадают в запрос,
+        # поэтому передаются в каждый get().
+        client = AsyncClient()
+        for url in self.get_urls():
+            with self.subTest(url=url):
+                expected = await sync_to_async(sync_client.get)(url)
+                response = await client.get(url, headers=headers)
+                self.assertEqual(
+                    response.asgi_request.urlconf, "recipe.async_urls")
+                self.assertEqual(response.status_code, expected.status_code)
+                self.assertEqual(response.json(), expected.json())
+                self.assertEqual(response.get("ETag"), expected.get("ETag"))
+                if response.has_header("ETag"):
+                    response = await client.get(url, headers={
+                        **headers, "If-None-Match": response["ETag"]})
+                    self.assertEqual(response.status_code, 304)
+
+    async def test_anonymous(self):
+        await self.assert_same(self.anonymous, {})
+
+    async def test_authenticated(self):
+        token = await Token.objects.aget(user=self.reader)
+        await self.assert_same(
+            self.client, {"Authorization": f"Token {token.key}"})
@@ -0,0 +1,55 @@
+from django.core.cache import cache
+
+from recipe.authentication import GENERATION_KEY, SharedTokenCache
+
+from .base import FoodgramTestCase
+
+STATE_URL = "/api/users/me/state/"
+
+
+class SharedTokenCacheTests(FoodgramTestCase):
+    def setUp(self):
+        super().setUp()
+        self.token_cache = SharedTokenCache(60)
+        self.token_cache.set("key", (self.reader, "token"))
+
+    def test_delete_users(self):
+        self.assertEqual(self.token_cache.get("key"), (self.reader, "token"))
+        self.token_cache.delete_users([self.author.pk])
+        self.assertIsNotNone(self.token_cache.get("key"))
+        self.token_cache.delete_users([self.reader.pk])
+        self.assertIsNone(self.token_cache.get("key"))
+
+    def test_generation_evicted(self):
+        cache.delete(GENERATION_KEY.format(self.reader.pk))
+        self.assertIsNone(self.token_cache.get("key"))
+        self.token_cache.set("key", (self.reader, "token"))
+        self.assertIsNotNone(self.token_cache.get("key"))
+
+
+class TokenAuthenticationTests(FoodgramTestCase):
+    def test_logout(self):
+        self.assertEqual(self.client.get(STATE_URL).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/api/auth/token/logout/")
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.client.get(STATE_URL).status_code, 401)
+
+    def test_deactivation(self):
+        self.assertEqual(self.client.get(STATE_URL).status_code, 200)
+        self.reader.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.reader.save()
+        self.assertEqual(self.client.get(STATE_URL).status_code, 401)
+
+    def test_version_bumps(self):
+        recipe = self.recipes[6]
+        etag = self.client.get(STATE_URL)["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get(STATE_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.favorites.add(self.reader)
+        response = self.client.get(STATE_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(recipe.pk, response.json()["favorites"])
@@ -0,0 +1,112 @@
+from collections import Counter
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+
+from recipe.models import IngredientRecipe, Recipe, ShoppingCartTotal
+
+from .base import FoodgramTestCase, User
+
+
+class CartTotalsTests(FoodgramTestCase):
+    """Итоги списка покупок совпадают с суммой по рецептам в корзине."""
+
+    def assertTotalsConsistent(self):
+        call_command("cart_totals", "--verify", stdout=StringIO())
+        for user in User.objects.all():
+            expected = Counter()
+            for ingredient_id, amount in IngredientRecipe.objects.filter(
+                    recipe__shopping_cart=user
+            ).values_list("ingredient_id", "amount"):
+                expected[ingredient_id] += amount
+            stored = dict(ShoppingCartTotal.objects.filter(
+                user=user).values_list("ingredient_id", "amount"))
+            self.assertEqual(stored, dict(expected), user.username)
+
+    def test_add_and_remove(self):
+        self.assertTotalsConsistent()
+        recipe = self.recipes[0]
+        url = f"/api/recipes/{recipe.pk}/shopping_cart/"
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.assertTotalsConsistent()
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertTotalsConsistent()
+
+    def test_bulk(self):
+        url = "/api/recipes/shopping_cart/"
+        ids = [recipe.pk for recipe in self.recipes]
+        response = self.client.post(url, {"recipes": ids}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertTotalsConsistent()
+        response = self.client.delete(url, {"all": True}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(
+            ShoppingCartTotal.objects.filter(user=self.reader).exists())
+
+    def test_clear_from_recipe(self):
+        self.author.shoping_recipes.add(self.recipes[2])
+        self.recipes[2].shopping_cart.clear()
+        self.assertTotalsConsistent()
+
+    def test_recipe_ingredients_changed(self):
+        first, second = self.ingredients[:2]
+        response = self.author_client.patch(
+            f"/api/recipes/{self.recipes[2].pk}/",
+            {
+                "tags": [self.dinner.pk],
+                "ingredients": [{"id": first.pk, "amount": 7},
+                                {"id": second.pk, "amount": 3}],
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTotalsConsistent()
+
+    def test_recipe_deleted(self):
+        response = self.author_client.delete(
+            f"/api/recipes/{self.recipes[3].pk}/")
+        self.assertEqual(response.status_code, 204)
+        self.assertTotalsConsistent()
+
+    def test_admin_inline(self):
+        self.client.force_login(User.objects.create_superuser(
+            username="admin", email="admin@example.com", password="password"))
+        recipe = self.recipes[2]
+        rows = list(recipe.recipes.order_by("pk"))
+        tags = list(Recipe.tags.through.objects.filter(recipe=recipe))
+        data = {
+            "name": recipe.name, "text": recipe.text,
+            "cooking_time": recipe.cooking_time, "author": recipe.author_id,
+            "recipes-TOTAL_FORMS": 3, "recipes-INITIAL_FORMS": 2,
+            "recipes-0-id": rows[0].pk, "recipes-0-recipe": recipe.pk,
+            "recipes-0-ingredient": rows[0].ingredient_id,
+            "recipes-0-amount": 50,
+            "recipes-1-id": rows[1].pk, "recipes-1-recipe": recipe.pk,
+            "recipes-1-ingredient": rows[1].ingredient_id,
+            "recipes-1-amount": rows[1].amount, "recipes-1-DELETE": "on",
+            "recipes-2-recipe": recipe.pk,
+            "recipes-2-ingredient": self.ingredients[3].pk,
+            "recipes-2-amount": 7,
+            "Recipe_tags-TOTAL_FORMS": len(tags),
+            "Recipe_tags-INITIAL_FORMS": len(tags),
+        }
+        for number, link in enumerate(tags):
+            data.update({
+                f"Recipe_tags-{number}-id": link.pk,
+                f"Recipe_tags-{number}-recipe": recipe.pk,
+                f"Recipe_tags-{number}-tag": link.tag_id,
+            })
+        response = self.client.post(
+            f"/admin/recipe/recipe/{recipe.pk}/change/", data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            dict(recipe.recipes.values_list("ingredient_id", "amount")),
+            {self.ingredients[0].pk: 50, self.ingredients[3].pk: 7})
+        self.assertTotalsConsistent()
+
+    def test_verify_and_rebuild(self):
+        ShoppingCartTotal.objects.filter(user=self.reader).update(amount=1)
+        with self.assertRaises(CommandError):
+            call_command("cart_totals", "--verify", stdout=StringIO())
+        call_command("cart_totals", stdout=StringIO())
+        self.assertTotalsConsistent()
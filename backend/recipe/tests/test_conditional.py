@@ -0,0 +1,88 @@
+from .base import IMAGE, FoodgramTestCase
+
+
+class ConditionalRequestTests(FoodgramTestCase):
+    def test_recipe_list(self):
+        url = "/api/recipes/?limit=3"
+        etag = self.anonymous.get(url)["ETag"]
+        with self.assertNumQueries(0):
+            response = self.anonymous.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.author_client.patch(
+                f"/api/recipes/{self.recipes[0].pk}/",
+                {
+                    "name": "Новое название",
+                    "tags": [self.breakfast.pk],
+                    "ingredients": [
+                        {"id": self.ingredients[0].pk, "amount": 1}],
+                },
+                format="json",
+            )
+        self.assertEqual(response.status_code, 200)
+        response = self.anonymous.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_recipe_list_cursor(self):
+        url = "/api/recipes/?cursor=&limit=2"
+        etag = self.client.get(url)["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        # Флаги пользователя входят в ETag.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                f"/api/recipes/{self.recipes[-1].pk}/favorite/")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()["results"][0]["is_favorited"])
+
+    def test_counter_ordering(self):
+        url = "/api/recipes/?ordering=-favorites_count"
+        etag = self.anonymous.get(url)["ETag"]
+        plain_etag = self.anonymous.get("/api/recipes/")["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipes[5].favorites.add(self.author, self.other_author)
+        self.assertEqual(
+            self.anonymous.get(url, HTTP_IF_NONE_MATCH=etag).status_code,
+            200)
+        self.assertEqual(
+            self.anonymous.get(
+                "/api/recipes/", HTTP_IF_NONE_MATCH=plain_etag).status_code,
+            304)
+
+    def test_recipe_detail(self):
+        url = f"/api/recipes/{self.recipes[0].pk}/"
+        response = self.anonymous.get(url)
+        self.assertNotIn("updated_at", response.json())
+        self.assertIn("Last-Modified", response)
+        with self.assertNumQueries(1):
+            not_modified = self.anonymous.get(
+                url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(not_modified.status_code, 304)
+        response = self.client.get(url)
+        self.assertNotEqual(response["ETag"], not_modified["ETag"])
+        self.assertNotIn("Last-Modified", response)
+        self.assertIn("private", response["Cache-Control"])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f"/api/recipes/{self.recipes[0].pk}/favorite/")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.json()["is_favorited"])
+
+    def test_response_fields(self):
+        self.use_temporary_media()
+        response = self.author_client.post(
+            "/api/recipes/",
+            {
+                "name": "Новый рецепт", "text": "Описание",
+                "cooking_time": 5, "tags": [self.breakfast.pk],
+                "ingredients": [{"id": self.ingredients[0].pk, "amount": 1}],
+                "image": IMAGE,
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn("updated_at", response.json())
+        listed = self.anonymous.get("/api/recipes/").json()["results"][0]
+        self.assertNotIn("updated_at", listed)
@@ -0,0 +1,76 @@
+from io import StringIO
+
+from django.core.management import call_command
+
+from recipe.models import Favorite, Recipe, ShoppingCart
+
+from .base import FoodgramTestCase, User
+
+
+class CounterTests(FoodgramTestCase):
+    """Денормализованные счётчики совпадают с числом связей."""
+
+    def assertCountersConsistent(self):
+        for recipe in Recipe.objects.all():
+            self.assertEqual(
+                recipe.favorites_count,
+                Favorite.objects.filter(recipe=recipe).count())
+            self.assertEqual(
+                recipe.in_carts_count,
+                ShoppingCart.objects.filter(recipe=recipe).count())
+        for user in User.objects.all():
+            self.assertEqual(user.recipes_count, user.recipes.count())
+            self.assertEqual(user.followers_count, user.followers.count())
+
+    def test_recipe_links(self):
+        self.assertCountersConsistent()
+        recipe = self.recipes[0]
+        recipe.favorites.add(self.author, self.other_author)
+        self.author.favorite_recipes.add(*self.recipes[1:4])
+        self.assertCountersConsistent()
+        recipe.favorites.remove(self.reader)
+        self.reader.shoping_recipes.remove(self.recipes[2])
+        self.assertCountersConsistent()
+        recipe.favorites.clear()
+        self.author.favorite_recipes.clear()
+        self.assertCountersConsistent()
+
+    def test_api(self):
+        recipe = self.recipes[5]
+        self.client.post(f"/api/recipes/{recipe.pk}/favorite/")
+        self.client.post(f"/api/recipes/{recipe.pk}/shopping_cart/")
+        self.client.delete(f"/api/recipes/{self.recipes[0].pk}/favorite/")
+        self.client.post(f"/api/users/{self.other_author.pk}/subscribe/")
+        self.client.delete(f"/api/users/{self.author.pk}/subscribe/")
+        self.author_client.delete(f"/api/recipes/{self.recipes[1].pk}/")
+        self.assertCountersConsistent()
+
+    def test_user_deleted(self):
+        # Связи удаляются каскадом, m2m_changed не отправляется.
+        self.author.favorite_recipes.add(self.recipes[0])
+        self.reader.delete()
+        self.assertCountersConsistent()
+        self.assertEqual(
+            list(Recipe.objects.filter(pk=self.recipes[0].pk).values_list(
+                "favorites_count", "in_carts_count")),
+            [(1, 0)])
+
+    def test_top(self):
+        self.author.favorite_recipes.add(self.recipes[1])
+        response = self.anonymous.get("/api/recipes/top/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(recipe["id"], recipe["favorites_count"])
+             for recipe in response.json()[:3]],
+            [(self.recipes[1].pk, 2), (self.recipes[2].pk, 1),
+             (self.recipes[0].pk, 1)])
+
+    def test_generate_data_flush(self):
+        options = {"users": 6, "recipes": 8, "ingredients_per_recipe": 2,
+                   "favorites": 20, "carts": 8, "subscriptions": 8,
+                   "stdout": StringIO()}
+        call_command("generate_data", **options)
+        generated = User.objects.filter(username__startswith="bench")
+        generated.first().favorite_recipes.add(*self.recipes)
+        call_command("generate_data", flush=True, **options)
+        self.assertCountersConsistent()
@@ -0,0 +1,31 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+from rest_framework.exceptions import ValidationError
+
+from recipe import fields
+from recipe.fields import Base64ImageField
+
+from .base import IMAGE
+
+
+class Base64ImageFieldTests(SimpleTestCase):
+    def decode(self, data):
+        return Base64ImageField().to_internal_value(data)
+
+    def test_wrapped_lines(self):
+        header, encoded = IMAGE.split(",")
+        wrapped = "\r\n".join(
+            encoded[start:start + 19] for start in range(0, len(encoded), 19))
+        expected = self.decode(IMAGE).read()
+        # Мелкие куски: после удаления пробелов они остаются кратны 4.
+        with mock.patch.object(fields, "DECODE_CHUNK_SIZE", 8):
+            image = self.decode(f"{header}, {wrapped}\n")
+        self.assertEqual(image.read(), expected)
+        self.assertEqual(image.name, "temp.png")
+
+    def test_invalid_characters(self):
+        header, encoded = IMAGE.split(",")
+        with self.assertRaises(ValidationError) as error:
+            self.decode(f"{header},{encoded[:8]}*{encoded[8:]}")
+        self.assertEqual(error.exception.detail[0].code, "invalid_base64")
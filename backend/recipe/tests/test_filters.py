@@ -0,0 +1,59 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipe.models import Tag
+
+from .base import FoodgramTestCase, create_recipe
+
+
+class TagFilterTests(FoodgramTestCase):
+    def get_ids(self, query):
+        response = self.anonymous.get(f"/api/recipes/?limit=20&{query}")
+        self.assertEqual(response.status_code, 200)
+        ids = [recipe["id"] for recipe in response.json()["results"]]
+        self.assertEqual(len(ids), len(set(ids)))
+        return set(ids)
+
+    def test_any_and_all(self):
+        everything = {recipe.pk for recipe in self.recipes}
+        dinner = {recipe.pk for recipe in self.recipes[1::2]}
+        self.assertEqual(self.get_ids("tags=breakfast"), everything)
+        self.assertEqual(self.get_ids("tags=dinner"), dinner)
+        self.assertEqual(
+            self.get_ids("tags=breakfast&tags=dinner"), everything)
+        self.assertEqual(
+            self.get_ids("tags=breakfast&tags=dinner&tags_match=all"),
+            dinner)
+        self.assertEqual(
+            self.get_ids("tags=dinner&tags_match=any"), dinner)
+
+    def test_count_without_duplicates(self):
+        response = self.anonymous.get(
+            "/api/recipes/?tags=breakfast&tags=dinner")
+        self.assertEqual(response.json()["count"], len(self.recipes))
+
+    def test_no_extra_queries(self):
+        self.get_ids("tags=breakfast")
+        with CaptureQueriesContext(connection) as plain:
+            self.get_ids("author=%d" % self.author.pk)
+        with CaptureQueriesContext(connection) as filtered:
+            self.get_ids(
+                "author=%d&tags=breakfast&tags=dinner&tags_match=all"
+                % self.author.pk)
+        self.assertEqual(len(filtered), len(plain))
+        self.assertFalse(any(
+            "DISTINCT" in query["sql"] for query in filtered.captured_queries))
+
+    def test_unknown_slug(self):
+        response = self.anonymous.get("/api/recipes/?tags=unknown")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("tags", response.json())
+
+    def test_new_tag(self):
+        self.get_ids("tags=breakfast")
+        with self.captureOnCommitCallbacks(execute=True):
+            lunch = Tag.objects.create(
+                name="Обед", color="#49B64E", slug="lunch")
+        recipe = create_recipe(
+            self.author, "Обед", {self.ingredients[0]: 1}, (lunch,))
+        self.assertEqual(self.get_ids("tags=lunch"), {recipe.pk})
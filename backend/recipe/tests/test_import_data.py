@@ -0,0 +1,184 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+from recipe.management.commands import import_data
+from recipe.models import Ingredient, IngredientRecipe, Recipe, Tag
+
+from .base import FoodgramTestCase, User
+
+
+class ImportDataTests(FoodgramTestCase):
+    def write(self, suffix, content):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            file.write(content)
+        return path
+
+    def load(self, path, **options):
+        call_command("import_data", path, stdout=StringIO(), verbosity=0,
+                     **options)
+
+    def get_ingredients(self):
+        return set(Ingredient.objects.values_list(
+            "name", "measurement_unit"))
+
+    def test_ingredient_formats(self):
+        rows = [("Соль", "г"), ("Вода", "мл"), ("Соль", "щепотка")]
+        paths = [
+            self.write(".json", json.dumps([
+                {"name": name, "measurement_unit": unit}
+                for name, unit in rows])),
+            self.write(".jsonl", "\n".join(
+                json.dumps({"name": name, "measurement_unit": unit})
+                for name, unit in rows) + "\n\n"),
+            self.write(".csv", "".join(
+                f"{name},{unit}\n" for name, unit in rows)),
+        ]
+        before = self.get_ingredients()
+        for path in paths:
+            with self.subTest(path=path):
+                self.load(path, batch_size=2)
+                self.assertEqual(self.get_ingredients(), before | set(rows))
+
+    def test_csv_header(self):
+        path = self.write(".csv", "measurement_unit,name\nкг, Мука \n")
+        self.load(path, header=True)
+        self.assertIn(("Мука", "кг"), self.get_ingredients())
+
+    def test_json_streamed_in_chunks(self):
+        items = [{"name": f"Специя {number}", "measurement_unit": "г"}
+                 for number in range(20)]
+        path = self.write(".json", "  [\n" + ",\n".join(
+            json.dumps(item, ensure_ascii=False) for item in items) + "\n]")
+        with mock.patch.object(import_data, "READ_CHUNK_SIZE", 7):
+            with open(path, encoding="utf-8") as file:
+                self.assertEqual(
+                    list(import_data.iter_json_array(file)), items)
+
+    def test_invalid_files(self):
+        for suffix, content in (
+            (".json", '{"name": "Соль"}'),
+            (".json", '[{"name": "Соль", '),
+            (".jsonl", '{"name": "Соль"}\n{broken\n'),
+            (".json", '[{"name": "Соль"}]'),
+        ):
+            with self.subTest(content=content):
+                with self.assertRaises(CommandError):
+                    self.load(self.write(suffix, content))
+
+    def test_tags_updated(self):
+        path = self.write(".json", json.dumps([
+            {"name": "Поздний ужин", "color": "#000000", "slug": "dinner"},
+            {"name": "Обед", "color": "#49B64E", "slug": "lunch"},
+        ]))
+        self.load(path, model="tags")
+        self.dinner.refresh_from_db()
+        self.assertEqual(self.dinner.name, "Поздний ужин")
+        self.assertTrue(Tag.objects.filter(slug="lunch").exists())
+
+    def test_recipes_idempotent(self):
+        records = [
+            {"author": "other", "name": f"Импорт {number}",
+             "text": "Описание", "cooking_time": 5,
+             "tags": ["breakfast", "dinner"],
+             "ingredients": [
+                 {"name": "Ингредиент 0", "measurement_unit": "г",
+                  "amount": 10},
+                 {"name": "Новый", "measurement_unit": "шт", "amount": 1},
+                 {"name": "Новый", "measurement_unit": "шт", "amount": 2},
+             ]}
+            for number in range(3)
+        ]
+        path = self.write(".jsonl", "\n".join(map(json.dumps, records)))
+        counts = None
+        for _ in range(2):
+            self.load(path, model="recipes", batch_size=2)
+            state = (
+                Recipe.objects.count(),
+                Ingredient.objects.count(),
+                IngredientRecipe.objects.count(),
+                Recipe.tags.through.objects.count(),
+                User.objects.get(username="other").recipes_count,
+            )
+            self.assertEqual(state, counts or state)
+            counts = state
+        recipe = Recipe.objects.get(name="Импорт 0")
+        self.assertEqual(
+            dict(recipe.recipes.values_list(
+                "ingredient__name", "amount")),
+            {"Ингредиент 0": 10, "Новый": 3})
+        self.assertEqual(counts[0], len(self.recipes) + 3)
+        self.assertEqual(counts[4], 6)
+
+    def test_unknown_author(self):
+        path = self.write(".jsonl", json.dumps({
+            "author": "nobody", "name": "Рецепт", "text": "Описание",
+            "cooking_time": 5}))
+        with self.assertRaisesMessage(CommandError, "nobody"):
+            self.load(path, model="recipes")
+
+
+class MergeDuplicateIngredientsTests(TransactionTestCase):
+    """Миграция 0009 сливает дубли ингредиентов перед ограничением."""
+
+    before = [("recipe", "0008_recipe_image_variants")]
+    after = [("recipe", "0009_merge_duplicate_ingredients")]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+        super().tearDown()
+
+    def test_merge(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        apps = executor.loader.project_state(self.before).apps
+        # Миграции users не откатываются, пользователь создаётся как обычно.
+        user = User.objects.create_user(
+            username="cook", email="cook@example.com")
+        Ingredient = apps.get_model("recipe", "Ingredient")
+        salt, duplicate, other = (
+            Ingredient.objects.create(name=name, measurement_unit="г")
+            for name in ("Соль", "Соль", "Сахар"))
+        Recipe = apps.get_model("recipe", "Recipe")
+        first, second = (
+            Recipe.objects.create(
+                author_id=user.pk, name=name, text="Описание", cooking_time=5,
+                image="recipes/images/test.png")
+            for name in ("Первый", "Второй"))
+        IngredientRecipe = apps.get_model("recipe", "IngredientRecipe")
+        for recipe, ingredient, amount in (
+            (first, salt, 1), (first, duplicate, 2), (first, other, 3),
+            (second, duplicate, 4),
+        ):
+            IngredientRecipe.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=amount)
+        apps.get_model("recipe", "ShoppingCartTotal").objects.create(
+            user_id=user.pk, ingredient=duplicate, amount=6)
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.after)
+        apps = executor.loader.project_state(self.after).apps
+        self.assertEqual(
+            list(apps.get_model("recipe", "Ingredient").objects.order_by(
+                "pk").values_list("pk", flat=True)),
+            [salt.pk, other.pk])
+        self.assertEqual(
+            set(apps.get_model("recipe", "IngredientRecipe").objects
+                .values_list("recipe", "ingredient", "amount")),
+            {(first.pk, salt.pk, 3), (first.pk, other.pk, 3),
+             (second.pk, salt.pk, 4)})
+        self.assertEqual(
+            list(apps.get_model("recipe", "ShoppingCartTotal").objects
+                 .values_list("ingredient", "amount")),
+            [(salt.pk, 6)])
@@ -0,0 +1,46 @@
+import unittest
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .base import FoodgramTestCase
+
+
+@unittest.skipUnless(connection.vendor == "postgresql",
+                     "Планы запросов проверяются только на PostgreSQL")
+class QueryPlanTests(FoodgramTestCase):
+    """Фильтры списка рецептов идут по индексам, а не Seq Scan."""
+
+    def explain(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        sql = next(
+            query["sql"] for query in queries
+            if ' FROM "recipe_recipe" ' in query["sql"]
+            and " LIMIT " in query["sql"]
+        )
+        with connection.cursor() as cursor:
+            # На нескольких строках планировщик всегда выбирает Seq Scan;
+            # без него видно, есть ли для запроса подходящий индекс.
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute(f"EXPLAIN {sql}")
+            return "\n".join(row[0] for row in cursor.fetchall())
+
+    def test_filters(self):
+        author = self.author.pk
+        for query, index in (
+            ("is_favorited=1", "favorite_user_recipe_idx"),
+            ("is_in_shopping_cart=1", "cart_user_recipe_idx"),
+            (f"author={author}", "recipe_author_pub_date_idx"),
+            (f"author={author}&ordering=-pub_date",
+             "recipe_author_pub_date_idx"),
+            (f"author={author}&cursor=", "recipe_author_pub_date_idx"),
+            ("tags=breakfast", None),
+            ("tags=breakfast&tags=dinner&tags_match=all", None),
+        ):
+            with self.subTest(query=query):
+                plan = self.explain(f"/api/recipes/?{query}")
+                self.assertNotIn("Seq Scan", plan)
+                if index is not None:
+                    self.assertIn(index, plan)
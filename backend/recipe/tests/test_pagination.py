@@ -0,0 +1,54 @@
+from .base import FoodgramTestCase, encode_cursor
+
+
+class CursorTests(FoodgramTestCase):
+    def collect(self, client, url):
+        ids = []
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn("count", response.json())
+            ids.extend(item["id"] for item in response.json()["results"])
+            url = response.json()["next"]
+        return ids
+
+    def test_pages(self):
+        self.assertEqual(
+            self.collect(self.anonymous, "/api/recipes/?cursor=&limit=3"),
+            [recipe.pk for recipe in reversed(self.recipes)])
+        self.assertEqual(
+            self.collect(
+                self.client, "/api/recipes/?cursor=&limit=2"
+                f"&author={self.author.pk}&ordering=-pub_date"),
+            [recipe.pk for recipe in reversed(self.recipes[:4])])
+        self.assertEqual(
+            self.collect(
+                self.client, "/api/users/subscriptions/?cursor=&limit=1"),
+            [self.other_author.pk, self.author.pk])
+
+    def test_page_mode_unchanged(self):
+        response = self.anonymous.get("/api/recipes/?limit=2&page=2")
+        self.assertEqual(response.json()["count"], len(self.recipes))
+        self.assertEqual(
+            [recipe["id"] for recipe in response.json()["results"]],
+            [self.recipes[4].pk, self.recipes[3].pk])
+
+    def test_ordering_and_search_rejected(self):
+        for query in ("ordering=favorites_count", "ordering=-in_carts_count",
+                      "search=Рецепт"):
+            with self.subTest(query=query):
+                response = self.anonymous.get(
+                    f"/api/recipes/?{query}&cursor=")
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("cursor", response.json())
+
+    def test_invalid_cursor(self):
+        for values in (["x", "y"], [None, None], [1], ["2024-01-01", "1"]):
+            cursor = encode_cursor(values)
+            for url in ("/api/recipes/", "/api/recipes/feed/"):
+                with self.subTest(url=url, values=values):
+                    response = self.client.get(f"{url}?cursor={cursor}")
+                    self.assertEqual(response.status_code, 404)
+        response = self.client.get(
+            f"/api/users/subscriptions/?cursor={encode_cursor(['x'])}")
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,53 @@
+from .base import FoodgramTestCase
+
+
+class QueryCountTests(FoodgramTestCase):
+    """Число запросов не зависит от размера страницы."""
+
+    def assertQueriesPerPage(self, client, url, num, param="limit"):
+        # Первый запрос заполняет кэш справочников для фильтров.
+        client.get(url)
+        separator = "&" if "?" in url else "?"
+        for size in (1, 5):
+            with self.subTest(url=url, **{param: size}):
+                with self.assertNumQueries(num):
+                    response = client.get(f"{url}{separator}{param}={size}")
+                self.assertEqual(response.status_code, 200)
+
+    def test_recipe_list(self):
+        self.assertQueriesPerPage(self.anonymous, "/api/recipes/", 4)
+        self.assertQueriesPerPage(self.client, "/api/recipes/", 4)
+
+    def test_recipe_list_filters(self):
+        for query in (
+            "tags=breakfast",
+            f"author={self.author.pk}",
+            f"author={self.author.pk}&ordering=-favorites_count",
+            "is_favorited=1",
+            "is_in_shopping_cart=1",
+        ):
+            self.assertQueriesPerPage(
+                self.client, f"/api/recipes/?{query}", 4)
+
+    def test_recipe_list_cursor(self):
+        self.assertQueriesPerPage(self.client, "/api/recipes/?cursor=", 3)
+
+    def test_recipe_detail(self):
+        url = f"/api/recipes/{self.recipes[0].pk}/"
+        self.client.get(url)
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()["is_favorited"])
+
+    def test_subscriptions(self):
+        url = "/api/users/subscriptions/"
+        self.assertQueriesPerPage(self.client, url, 3)
+        self.assertQueriesPerPage(
+            self.client, f"{url}?limit=2", 3, param="recipes_limit")
+        response = self.client.get(f"{url}?recipes_limit=1")
+        for author in response.json()["results"]:
+            self.assertEqual(len(author["recipes"]), 1)
+
+    def test_feed(self):
+        self.assertQueriesPerPage(self.client, "/api/recipes/feed/", 5)
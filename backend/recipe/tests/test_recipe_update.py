@@ -0,0 +1,83 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipe.models import IngredientRecipe, ShoppingCartTotal
+
+from .base import FoodgramTestCase
+
+WRITES = ("INSERT", "UPDATE", "DELETE")
+
+
+class RecipeUpdateTests(FoodgramTestCase):
+    """PATCH рецепта пишет только разницу с текущим состоянием."""
+
+    def setUp(self):
+        super().setUp()
+        # Рецепт автора в корзине читателя: первый и четвёртый ингредиенты.
+        self.recipe = self.recipes[2]
+        self.url = f"/api/recipes/{self.recipe.pk}/"
+
+    def patch(self, amounts, **data):
+        data.setdefault("name", self.recipe.name)
+        data.setdefault("tags", [self.breakfast.pk])
+        data["ingredients"] = [
+            {"id": ingredient.pk, "amount": amount}
+            for ingredient, amount in amounts.items()
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.author_client.patch(
+                    self.url, data, format="json")
+        self.assertEqual(response.status_code, 200)
+        writes = [
+            query["sql"] for query in queries
+            if query["sql"].lstrip().upper().startswith(WRITES)
+        ]
+        return int(response["X-Rows-Written"]), writes
+
+    def get_amounts(self):
+        return dict(IngredientRecipe.objects.filter(
+            recipe=self.recipe).values_list("ingredient", "amount"))
+
+    def get_totals(self):
+        return dict(ShoppingCartTotal.objects.filter(
+            user=self.reader).values_list("ingredient", "amount"))
+
+    def test_noop(self):
+        first, _, _, fourth = self.ingredients
+        rows, writes = self.patch({first: 102, fourth: 5})
+        self.assertEqual(rows, 0)
+        self.assertEqual(writes, [])
+
+    def test_amount_only(self):
+        first, _, _, fourth = self.ingredients
+        totals = self.get_totals()
+        rows, writes = self.patch({first: 110, fourth: 5})
+        # Строка ингредиента и updated_at рецепта.
+        self.assertEqual(rows, 2)
+        self.assertFalse(any(sql.startswith(("INSERT", "DELETE"))
+                             for sql in writes if "ingredientrecipe" in sql))
+        self.assertEqual(self.get_amounts(), {first.pk: 110, fourth.pk: 5})
+        totals[first.pk] += 8
+        self.assertEqual(self.get_totals(), totals)
+
+    def test_insert_update_delete(self):
+        first, second, _, fourth = self.ingredients
+        totals = self.get_totals()
+        rows, _ = self.patch({first: 100, second: 3}, name="Новое название")
+        self.assertEqual(rows, 4)
+        self.assertEqual(self.get_amounts(), {first.pk: 100, second.pk: 3})
+        totals[first.pk] -= 2
+        totals[second.pk] = totals.get(second.pk, 0) + 3
+        totals[fourth.pk] -= 5
+        self.assertEqual(
+            self.get_totals(),
+            {pk: amount for pk, amount in totals.items() if amount})
+
+    def test_tags_only(self):
+        first, _, _, fourth = self.ingredients
+        rows, _ = self.patch(
+            {first: 102, fourth: 5}, tags=[self.breakfast.pk, self.dinner.pk])
+        self.assertEqual(rows, 2)
+        self.assertEqual(set(self.recipe.tags.values_list("slug", flat=True)),
+                         {"breakfast", "dinner"})
@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.db import transaction
+
+from recipe import cache
+from recipe.models import Ingredient, Tag
+
+from .base import FoodgramTestCase
+
+
+class ReferenceCacheTests(FoodgramTestCase):
+    def test_cached_list(self):
+        for url in ("/api/tags/", "/api/ingredients/"):
+            with self.subTest(url=url):
+                response = self.anonymous.get(url)
+                self.assertEqual(response.status_code, 200)
+                with self.assertNumQueries(0):
+                    cached = self.anonymous.get(url)
+                self.assertEqual(cached.content, response.content)
+                with self.assertNumQueries(0):
+                    response = self.anonymous.get(
+                        url, HTTP_IF_NONE_MATCH=response["ETag"])
+                self.assertEqual(response.status_code, 304)
+
+    def test_invalidated_on_commit(self):
+        for name, create in (
+            ("tags", lambda: Tag.objects.create(
+                name="Обед", color="#49B64E", slug="lunch")),
+            ("ingredients", lambda: Ingredient.objects.create(
+                name="Соль", measurement_unit="г")),
+        ):
+            with self.subTest(name=name):
+                version = cache.get_version(name)
+                with self.captureOnCommitCallbacks(execute=True):
+                    with transaction.atomic():
+                        item = create()
+                        self.assertEqual(cache.get_version(name), version)
+                self.assertNotEqual(cache.get_version(name), version)
+                response = self.anonymous.get(f"/api/{name}/")
+                self.assertIn(item.pk, [row["id"] for row in response.json()])
+
+                version = cache.get_version(name)
+                with self.captureOnCommitCallbacks(execute=True):
+                    item.delete()
+                self.assertNotEqual(cache.get_version(name), version)
+                response = self.anonymous.get(f"/api/{name}/")
+                self.assertNotIn(
+                    item.pk, [row["id"] for row in response.json()])
+
+    def test_max_entries(self):
+        if settings.CACHE_BACKEND in ("file", "locmem"):
+            self.assertEqual(
+                settings.CACHES["default"]["OPTIONS"]["MAX_ENTRIES"],
+                settings.CACHE_MAX_ENTRIES)
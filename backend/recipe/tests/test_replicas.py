@@ -0,0 +1,109 @@
+import os
+import shutil
+import tempfile
+from unittest import mock, skipIf
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import RequestFactory, SimpleTestCase
+from django.urls import resolve
+from rest_framework.authtoken.models import Token
+
+from recipe import replicas
+from recipe.models import Recipe, Tag
+
+READ_ALIASES = ("replica1", "replica2")
+
+
+@skipIf(replicas.get_replicas(), "Реплики уже заданы в DATABASES")
+class ReplicaRoutingTests(SimpleTestCase):
+    """Выбор реплики на двух локальных SQLite: рабочей и недоступной."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Псевдонимы добавляются после проверки databases: на этапе
+        # проверок и создания тестовых баз их ещё нет в настройках.
+        cls.directory = tempfile.mkdtemp()
+        names = (os.path.join(cls.directory, "replica.sqlite3"),
+                 os.path.join(cls.directory, "missing", "replica.sqlite3"))
+        for alias, name in zip(READ_ALIASES, names):
+            connections.settings[alias] = connections.configure_settings({
+                DEFAULT_DB_ALIAS: {},
+                alias: {"ENGINE": "django.db.backends.sqlite3",
+                        "NAME": name},
+            })[alias]
+        cls.databases = {*cls.databases, *READ_ALIASES}
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        for alias in READ_ALIASES:
+            connections[alias].close()
+            del connections[alias]
+            del connections.settings[alias]
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        # Недоступная реплика проверяется только в test_fallback.
+        replicas.unavailable.clear()
+        replicas.unavailable["replica2"] = float("inf")
+        self.addCleanup(replicas.unavailable.clear)
+        self.factory = RequestFactory()
+        token = replicas.read_alias.set(None)
+        self.addCleanup(replicas.read_alias.reset, token)
+
+    def route(self, path, method="get", urlconf=None, **headers):
+        request = getattr(self.factory, method)(path, **headers)
+        replicas.read_alias.set(None)
+        replicas.ReplicaMiddleware(lambda request: None).process_view(
+            request, resolve(path, urlconf).func, (), {})
+        return replicas.read_alias.get()
+
+    def test_routing(self):
+        self.assertEqual(self.route("/api/recipes/1/"), "replica1")
+        self.assertEqual(self.route("/api/tags/"), "replica1")
+        router = replicas.ReplicaRouter()
+        self.assertEqual(router.db_for_read(Recipe), "replica1")
+        self.assertEqual(Tag.objects.all().db, "replica1")
+        self.assertEqual(router.db_for_read(Token), DEFAULT_DB_ALIAS)
+        self.assertEqual(router.db_for_write(Recipe), DEFAULT_DB_ALIAS)
+        with mock.patch.object(
+                connections[DEFAULT_DB_ALIAS], "in_atomic_block", True):
+            self.assertEqual(router.db_for_read(Recipe), DEFAULT_DB_ALIAS)
+        self.assertIsNone(self.route("/api/recipes/1/", method="patch"))
+
+    def test_recipe_list_on_primary(self):
+        # ETag списка версионный, страница должна быть из основной базы.
+        self.assertIsNone(self.route("/api/recipes/"))
+        self.assertIsNone(self.route(
+            "/api/recipes/", urlconf="recipe.async_urls"))
+        self.assertEqual(self.route(
+            "/api/recipes/1/", urlconf="recipe.async_urls"), "replica1")
+
+    def test_sticky_after_write(self):
+        headers = {"HTTP_AUTHORIZATION": "Token first"}
+        self.assertEqual(self.route("/api/recipes/1/", **headers), "replica1")
+        middleware = replicas.ReplicaMiddleware(lambda request: None)
+        middleware.stick(self.factory.post("/api/recipes/", **headers))
+        self.assertIsNone(self.route("/api/recipes/1/", **headers))
+        self.assertEqual(self.route(
+            "/api/recipes/1/", HTTP_AUTHORIZATION="Token second"),
+            "replica1")
+
+    def test_fallback(self):
+        replicas.unavailable.clear()
+        with mock.patch.object(replicas.random, "shuffle", list.reverse):
+            with self.assertLogs("foodgram.replicas", "WARNING"):
+                self.assertEqual(replicas.choose_replica(), "replica1")
+        self.assertIn("replica2", replicas.unavailable)
+        self.assertNotIn("replica1", replicas.unavailable)
+        with mock.patch.object(
+                connections["replica1"], "ensure_connection",
+                side_effect=replicas.DatabaseError):
+            with self.assertLogs("foodgram.replicas", "WARNING"):
+                self.assertIsNone(replicas.choose_replica())
+        self.assertIsNone(self.route("/api/recipes/1/"))
+        replicas.unavailable.pop("replica1")
+        self.assertEqual(self.route("/api/recipes/1/"), "replica1")
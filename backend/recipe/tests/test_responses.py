@@ -0,0 +1,93 @@
+import gzip
+import json
+import unittest
+from decimal import Decimal
+from unittest import mock
+
+from django.test import override_settings
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from recipe import compression
+from recipe.renderers import FastJSONRenderer, orjson
+
+from .base import FoodgramTestCase
+
+
+@unittest.skipIf(orjson is None, "orjson не установлен")
+class FastJSONRendererTests(unittest.TestCase):
+    def test_same_as_json_renderer(self):
+        data = {
+            1: gettext_lazy("Рецепт"),
+            "amount": Decimal("1.5"),
+            "items": [None, True, {"id": 2}],
+        }
+        content = FastJSONRenderer().render(data)
+        self.assertEqual(content, JSONRenderer().render(data))
+        self.assertEqual(json.loads(content)["1"], "Рецепт")
+
+    def test_indent_falls_back(self):
+        content = FastJSONRenderer().render(
+            {"id": 1}, "application/json; indent=2")
+        self.assertEqual(content, b'{\n  "id": 1\n}')
+        self.assertEqual(FastJSONRenderer().render(None), b"")
+
+
+@override_settings(RESPONSE_COMPRESSION=True)
+class CompressionTests(FoodgramTestCase):
+    url = "/api/recipes/"
+
+    def get(self, encoding):
+        # Клиент загружает middleware при первом запросе, уже с настройкой.
+        return APIClient().get(self.url, HTTP_ACCEPT_ENCODING=encoding)
+
+    def test_gzip(self):
+        plain = self.get("")
+        self.assertFalse(plain.has_header("Content-Encoding"))
+        response = self.get("gzip, deflate")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+    def test_gzip_without_brotli_package(self):
+        with mock.patch.object(compression, "brotli", None):
+            response = self.get("br, gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+
+    @unittest.skipIf(compression.brotli is None, "brotli не установлен")
+    def test_brotli(self):
+        plain = self.get("")
+        response = self.get("gzip, deflate, br")
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(
+            compression.brotli.decompress(response.content), plain.content)
+
+
+class SparseFieldsTests(FoodgramTestCase):
+    def test_recipes(self):
+        response = self.client.get("/api/recipes/?fields=id,name,author")
+        for recipe in response.json()["results"]:
+            self.assertEqual(set(recipe), {"id", "name", "author"})
+            # Вложенные сериализаторы отдаются целиком.
+            self.assertIn("is_subscribed", recipe["author"])
+        response = self.client.get(
+            f"/api/recipes/{self.recipes[0].pk}/?fields=id, is_favorited")
+        self.assertEqual(response.json(), {
+            "id": self.recipes[0].pk, "is_favorited": True})
+
+    def test_users(self):
+        response = self.client.get("/api/users/?fields=id,username")
+        self.assertEqual(
+            {user["username"] for user in response.json()["results"]},
+            {"author", "other", "reader"})
+        for user in response.json()["results"]:
+            self.assertEqual(set(user), {"id", "username"})
+
+    def test_full_without_fields(self):
+        recipe = self.client.get(
+            f"/api/recipes/{self.recipes[0].pk}/").json()
+        self.assertIn("ingredients", recipe)
+        self.assertIn("tags", recipe)
+        self.assertIn("is_in_shopping_cart", recipe)
@@ -0,0 +1,77 @@
+from .base import FoodgramTestCase, User
+
+URL = "/api/users/me/state/"
+
+
+class UserStateTests(FoodgramTestCase):
+    def test_full_lists(self):
+        response = self.client.get(URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            "favorites": sorted(recipe.pk for recipe in self.recipes[:3]),
+            "shopping_cart": sorted(
+                recipe.pk for recipe in self.recipes[2:5]),
+            "subscriptions": sorted(
+                [self.author.pk, self.other_author.pk]),
+        })
+        self.assertEqual(self.anonymous.get(URL).status_code, 401)
+
+    def test_page_flags(self):
+        first, third, last = self.recipes[0], self.recipes[2], self.recipes[6]
+        response = self.client.get(
+            f"{URL}?recipes={first.pk},{third.pk},{last.pk}"
+            f"&authors={self.author.pk},{self.reader.pk}")
+        self.assertEqual(response.json(), {
+            "recipes": {
+                str(first.pk): {
+                    "is_favorited": True, "is_in_shopping_cart": False},
+                str(third.pk): {
+                    "is_favorited": True, "is_in_shopping_cart": True},
+                str(last.pk): {
+                    "is_favorited": False, "is_in_shopping_cart": False},
+            },
+            "authors": {
+                str(self.author.pk): {"is_subscribed": True},
+                str(self.reader.pk): {"is_subscribed": False},
+            },
+        })
+        response = self.client.get(f"{URL}?recipes=1,x")
+        self.assertEqual(response.status_code, 400)
+
+    def test_not_modified(self):
+        etag = self.client.get(URL)["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get(URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        for method, url in (
+            ("post", f"/api/recipes/{self.recipes[6].pk}/favorite/"),
+            ("post", f"/api/recipes/{self.recipes[6].pk}/shopping_cart/"),
+            ("delete", f"/api/users/{self.author.pk}/subscribe/"),
+        ):
+            with self.subTest(method=method, url=url):
+                with self.captureOnCommitCallbacks(execute=True):
+                    getattr(self.client, method)(url)
+                response = self.client.get(URL, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                etag = response["ETag"]
+
+    def test_user_versions(self):
+        versions = User.objects.filter(pk=self.reader.pk).values_list(
+            "favorites_version", "cart_version")
+        before = versions.get()
+        self.recipes[0].favorites.add(self.author)
+        self.assertEqual(versions.get(), before)
+        self.recipes[0].favorites.remove(self.reader)
+        self.assertEqual(versions.get(), (before[0] + 1, before[1]))
+        # Удаление рецепта удаляет связи каскадом, без m2m_changed.
+        self.recipes[2].delete()
+        self.assertEqual(versions.get(), (before[0] + 2, before[1] + 1))
+
+    def test_user_state_after_recipe_deleted(self):
+        url = "/api/users/me/state/"
+        etag = self.client.get(url)["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author_client.delete(f"/api/recipes/{self.recipes[2].pk}/")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(self.recipes[2].pk, response.json()["favorites"])
@@ -0,0 +1,69 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import override_settings
+
+from recipe.models import TimelineEntry
+
+from .base import FoodgramTestCase, create_recipe
+
+
+class TimelineTests(FoodgramTestCase):
+    def feed_ids(self, client=None):
+        response = (client or self.client).get("/api/recipes/feed/?limit=20")
+        self.assertEqual(response.status_code, 200)
+        return [recipe["id"] for recipe in response.json()["results"]]
+
+    def test_backfill_and_fan_out(self):
+        self.assertEqual(
+            self.feed_ids(), [recipe.pk for recipe in reversed(self.recipes)])
+        recipe = create_recipe(
+            self.author, "Новый рецепт", {self.ingredients[0]: 1})
+        self.assertEqual(self.feed_ids()[0], recipe.pk)
+        self.assertEqual(self.feed_ids(self.author_client), [])
+
+    def test_unfollow_and_follow(self):
+        self.client.delete(f"/api/users/{self.author.pk}/subscribe/")
+        self.assertEqual(
+            self.feed_ids(), [recipe.pk for recipe in self.recipes[:3:-1]])
+        self.client.post(f"/api/users/{self.author.pk}/subscribe/")
+        self.assertEqual(
+            self.feed_ids(), [recipe.pk for recipe in reversed(self.recipes)])
+
+    @override_settings(FEED_FANOUT_LIMIT=0)
+    def test_pulled_author(self):
+        recipe = create_recipe(
+            self.author, "Рецепт популярного автора", {self.ingredients[0]: 1})
+        self.author.refresh_from_db()
+        self.assertTrue(self.author.feed_pull)
+        self.assertFalse(TimelineEntry.objects.filter(recipe=recipe).exists())
+        self.assertEqual(self.feed_ids()[0], recipe.pk)
+
+    def test_rebuild(self):
+        entries = set(TimelineEntry.objects.values_list("user", "recipe"))
+        TimelineEntry.objects.rebuild()
+        self.assertEqual(
+            set(TimelineEntry.objects.values_list("user", "recipe")), entries)
+
+    def test_import_fan_out(self):
+        records = [
+            {"author": "author", "name": f"Импортированный {number}",
+             "text": "Описание", "cooking_time": 5, "tags": ["dinner"],
+             "ingredients": [{"name": "Ингредиент 0",
+                              "measurement_unit": "г", "amount": 10}]}
+            for number in range(2)
+        ]
+        fd, path = tempfile.mkstemp(suffix=".jsonl")
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            file.writelines(json.dumps(record) + "\n" for record in records)
+        call_command("import_data", path, model="recipes", verbosity=0,
+                     stdout=StringIO())
+        imported = set(TimelineEntry.objects.filter(
+            recipe__name__startswith="Импортированный",
+        ).values_list("user", flat=True))
+        self.assertEqual(imported, {self.reader.pk})
+        self.assertEqual(len(self.feed_ids()), len(self.recipes) + 2)
@@ -4,6 +4,7 @@ from rest_framework import routers
 from .views import (
     CustomUserViewSet,
     IngredientViewSet,
+    MetricsView,
     RecipeViewSet,
     TagViewSet,
 )
@@ -17,4 +18,5 @@ router.register(r"users", CustomUserViewSet)
 urlpatterns = [
     path("", include(router.urls)),
     path("auth/", include("djoser.urls.authtoken")),
+    path("metrics/", MetricsView.as_view(), name="metrics"),
 ]
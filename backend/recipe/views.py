@@ -1,35 +1,60 @@
-import csv
+import hashlib
 
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Prefetch, Value
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import (get_conditional_response,
+                                patch_cache_control, patch_vary_headers)
+from django.utils.http import quote_etag
 from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import OrderingFilter
 from rest_framework.mixins import ListModelMixin, RetrieveModelMixin
-from rest_framework.permissions import (IsAuthenticated,
+from rest_framework.permissions import (IsAdminUser, IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.viewsets import GenericViewSet, ModelViewSet
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet as DjoserUserViewSet
 
+from .cache import get_version
 from .filters import IngredientFilter, RecipeFilter
-from .models import (Ingredient, IngredientRecipe, Recipe,
-                     Subscription, Tag, User)
+from .models import (Ingredient, Recipe, ShoppingCartTotal, Subscription,
+                     Tag, TimelineEntry, User)
+from .metrics import ROWS_WRITTEN_HEADER, registry
+from .mixins import (CachedListMixin, ConditionalRecipeMixin,
+                     get_sparse_fields, get_user_state)
 from .permissions import CurrentUserOrAdminOrReadOnly
-from .serializers import (IngredientSerializer, RecipeSerializer,
+from .serializers import (IngredientSerializer, RecipeIdsSerializer,
+                          RecipeSerializer, ShoppingCartTotalSerializer,
                           SimplifiedRecipeSerializer, TagSerializer,
-                          UserSubscriptionSerializer)
+                          TopRecipeSerializer, UserSubscriptionSerializer)
+from .shopping_list import (CONTENT_TYPES, STREAMERS,
+                            ShoppingListNegotiation, render_pdf)
 
+TOP_RECIPES_CACHE_KEY = 'recipes:top'
+STATE_IDS_LIMIT = 500
 
-class TagViewSet(RetrieveModelMixin, ListModelMixin, GenericViewSet):
+
+class TagViewSet(CachedListMixin, RetrieveModelMixin, ListModelMixin,
+                 GenericViewSet):
+    cache_name = 'tags'
+    replica_actions = ('list', 'retrieve')
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
     permission_classes = [IsAuthenticatedOrReadOnly]
 
 
-class IngredientViewSet(RetrieveModelMixin, ListModelMixin, GenericViewSet):
+class IngredientViewSet(CachedListMixin, RetrieveModelMixin, ListModelMixin,
+                        GenericViewSet):
+    cache_name = 'ingredients'
+    replica_actions = ('list', 'retrieve')
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
@@ -38,11 +63,16 @@ class IngredientViewSet(RetrieveModelMixin, ListModelMixin, GenericViewSet):
     filterset_class = IngredientFilter
 
 
-class RecipeViewSet(ModelViewSet):
+class RecipeViewSet(ConditionalRecipeMixin, ModelViewSet):
+    # ETag списка берётся из версии рецептов, которая меняется при коммите
+    # в основную базу: страница с отставшей реплики закэшировалась бы
+    # под новым ETag. Поэтому список читается из основной базы.
+    replica_actions = ('retrieve', 'top', 'feed')
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
-    filter_backends = (DjangoFilterBackend,)
+    filter_backends = (DjangoFilterBackend, OrderingFilter)
     filterset_class = RecipeFilter
+    ordering_fields = ('pub_date', 'favorites_count', 'in_carts_count')
     http_method_names = [
         'get',
         'post',
@@ -51,8 +81,28 @@ class RecipeViewSet(ModelViewSet):
     ]
     permission_classes = [CurrentUserOrAdminOrReadOnly]
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve', 'feed'):
+            queryset = queryset.with_user_flags(
+                self.request.user
+            ).with_related(get_sparse_fields(self.request))
+        return queryset
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user,)
+        self.rows_written = serializer.rows_written
+
+    def perform_update(self, serializer):
+        serializer.save()
+        self.rows_written = serializer.rows_written
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs)
+        if hasattr(self, 'rows_written'):
+            response[ROWS_WRITTEN_HEADER] = self.rows_written
+        return response
 
     def get_serializer_context(self):
 
@@ -98,38 +148,218 @@ class RecipeViewSet(ModelViewSet):
     def shopping_cart(self, request, pk=None):
         return self.handle_recipe_list_toggle(request, pk, 'shopping_cart')
 
-    @action(detail=False, methods=['get'], url_path='download_shopping_cart',
+    def handle_recipe_list_bulk(self, request, list_type):
+        serializer = RecipeIdsSerializer(
+            data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['recipes']
+        user = request.user
+        descriptor = getattr(Recipe, list_type)
+        through = descriptor.through
+        # Менеджер со стороны пользователя: add() вставляет недостающие
+        # строки одним bulk_create, а m2m_changed обновляет счётчики,
+        # итоги корзины и версию пользователя. У явной промежуточной
+        # модели ignore_conflicts не используется, поэтому уже
+        # добавленные рецепты отсеиваются заранее под блокировкой.
+        user_list = getattr(user, descriptor.rel.get_accessor_name())
+
+        with transaction.atomic():
+            # Параллельные пакеты одного пользователя идут по очереди.
+            list(User.objects.select_for_update().filter(
+                pk=user.pk).values_list('pk'))
+            linked = through.objects.filter(user=user)
+            if serializer.validated_data['all']:
+                ids = list(linked.order_by('recipe_id').values_list(
+                    'recipe_id', flat=True))
+                user_list.clear()
+                self.rows_written = len(ids)
+                return Response({'results': [
+                    {'id': pk, 'status': 'removed'} for pk in ids]})
+
+            found = set(Recipe.objects.filter(
+                pk__in=ids).values_list('pk', flat=True))
+            present = set(linked.filter(
+                recipe_id__in=found).values_list('recipe_id', flat=True))
+            if request.method == 'POST':
+                changed = found - present
+                statuses = ('added', 'already_added')
+                if changed:
+                    user_list.add(*changed)
+            else:
+                changed = found & present
+                statuses = ('removed', 'not_added')
+                if changed:
+                    user_list.remove(*changed)
+
+        self.rows_written = len(changed)
+        results = []
+        for pk in ids:
+            if pk not in found:
+                result = 'not_found'
+            else:
+                result = statuses[pk not in changed]
+            results.append({'id': pk, 'status': result})
+        return Response({'results': results})
+
+    @action(detail=False, methods=['post', 'delete'], url_path='favorite',
+            url_name='favorite-bulk', permission_classes=[IsAuthenticated])
+    def favorite_bulk(self, request):
+        return self.handle_recipe_list_bulk(request, 'favorites')
+
+    @action(detail=False, methods=['post', 'delete'],
+            url_path='shopping_cart', url_name='shopping-cart-bulk',
             permission_classes=[IsAuthenticated])
-    def download_shopping_cart(self, request):
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = (
-            'attachment; filename="shopping_list.csv"')
+    def shopping_cart_bulk(self, request):
+        return self.handle_recipe_list_bulk(request, 'shopping_cart')
+
+    def get_shopping_cart_etag(self, user, file_format):
+        # Хэш самих строк итогов: у разных корзин совпадают суммы, но не
+        # строки. Переименование ингредиента меняет версию справочника.
+        rows = ShoppingCartTotal.objects.filter(
+            user=user
+        ).order_by('ingredient_id').values_list('ingredient_id', 'amount')
+        digest = hashlib.md5(usedforsecurity=False)
+        digest.update(get_version('ingredients').encode())
+        for ingredient_id, amount in rows:
+            digest.update(f':{ingredient_id}-{amount}'.encode())
+        return quote_etag(f'{file_format}-{digest.hexdigest()}')
+
+    @action(detail=False, methods=['get'])
+    def top(self, request):
+        data = cache.get(TOP_RECIPES_CACHE_KEY)
+        if data is None:
+            recipes = Recipe.objects.order_by(
+                '-favorites_count', '-pub_date'
+            )[:settings.TOP_RECIPES_LIMIT]
+            data = TopRecipeSerializer(
+                recipes, many=True, context={'request': request}).data
+            cache.set(TOP_RECIPES_CACHE_KEY, data,
+                      timeout=settings.TOP_RECIPES_CACHE_TIMEOUT)
+        return Response(data)
+
+    @action(detail=False, methods=['get'],
+            permission_classes=[IsAuthenticated])
+    def feed(self, request):
+        """Новые рецепты авторов из подписок, только курсорная пагинация."""
+        paginator = self.paginator
+        position = paginator.start_keyset(request, ('pub_date', 'id'))
+        ids = TimelineEntry.objects.page(
+            request.user, position, paginator.keyset_page_size + 1)
+        recipes = self.get_queryset().in_bulk(ids)
+        page = paginator.get_keyset_page(
+            [recipes[pk] for pk in ids if pk in recipes])
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
-        writer = csv.writer(response)
-        writer.writerow(['Ingredient', 'Total Amount', 'Measurement Unit'])
+    @action(detail=False, methods=['get'], url_path='download_shopping_cart',
+            permission_classes=[IsAuthenticated],
+            content_negotiation_class=ShoppingListNegotiation)
+    def download_shopping_cart(self, request):
+        file_format = request.query_params.get('format', 'csv')
+        if file_format not in CONTENT_TYPES:
+            return Response(
+                {'error': f'Unsupported format: {file_format}'},
+                status=status.HTTP_400_BAD_REQUEST)
 
         user = request.user
+        etag = self.get_shopping_cart_etag(user, file_format)
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
 
-        ingredients = IngredientRecipe.objects.filter(
-            recipe__shopping_cart=user
+        ingredients = ShoppingCartTotal.objects.filter(
+            user=user
         ).values(
             'ingredient__name', 'ingredient__measurement_unit'
         ).annotate(
-            total_amount=Sum('amount')
-        ).order_by('ingredient__name')
+            total_amount=F('amount')
+        ).order_by('ingredient__name').iterator(chunk_size=500)
+
+        if file_format == 'pdf':
+            response = HttpResponse(
+                render_pdf(ingredients), content_type=CONTENT_TYPES['pdf'])
+        else:
+            response = StreamingHttpResponse(
+                STREAMERS[file_format](ingredients),
+                content_type=CONTENT_TYPES[file_format])
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_list.{file_format}"')
+        response['ETag'] = etag
+        return response
 
-        for ingredient in ingredients:
-            writer.writerow([
-                ingredient['ingredient__name'],
-                ingredient['total_amount'],
-                ingredient['ingredient__measurement_unit']
-            ])
+    @action(detail=False, methods=['get'], url_path='shopping_cart/summary',
+            permission_classes=[IsAuthenticated])
+    def shopping_cart_summary(self, request):
+        totals = ShoppingCartTotal.objects.filter(
+            user=request.user
+        ).select_related('ingredient').order_by('ingredient__name')
+        serializer = ShoppingCartTotalSerializer(totals, many=True)
+        return Response(serializer.data)
 
-        return response
+
+def annotate_is_subscribed(queryset, user):
+    if not user.is_authenticated:
+        return queryset.annotate(is_subscribed=Value(False))
+    return queryset.annotate(is_subscribed=Exists(
+        Subscription.objects.filter(
+            subscriber=user, subscribed_to=OuterRef('pk'))
+    ))
+
+
+def parse_ids(value, name):
+    """Список ID из параметра вида 1,2,3."""
+    try:
+        ids = {int(item) for item in value.split(',') if item.strip()}
+    except ValueError:
+        raise ValidationError({name: 'Ожидается список ID через запятую.'})
+    if len(ids) > STATE_IDS_LIMIT:
+        raise ValidationError(
+            {name: f'Не больше {STATE_IDS_LIMIT} ID за запрос.'})
+    return ids
+
+
+def get_user_links(user, recipe_ids=None, author_ids=None):
+    """Избранное, корзина и подписки пользователя одним запросом.
+
+    None означает все ID; пустое множество исключает список из запроса.
+    """
+    parts = []
+    for kind, model, field, ids in (
+        ('favorites', Recipe.favorites.through, 'recipe_id', recipe_ids),
+        ('shopping_cart', Recipe.shopping_cart.through, 'recipe_id',
+         recipe_ids),
+    ):
+        if ids is None or ids:
+            rows = model.objects.filter(user=user)
+            if ids is not None:
+                rows = rows.filter(**{f'{field}__in': ids})
+            parts.append(rows.annotate(kind=Value(kind)).values_list(
+                field, 'kind'))
+    if author_ids is None or author_ids:
+        rows = Subscription.objects.filter(subscriber=user)
+        if author_ids is not None:
+            rows = rows.filter(subscribed_to_id__in=author_ids)
+        parts.append(rows.annotate(kind=Value('subscriptions')).values_list(
+            'subscribed_to_id', 'kind'))
+
+    links = {'favorites': set(), 'shopping_cart': set(),
+             'subscriptions': set()}
+    if parts:
+        for pk, kind in parts[0].union(*parts[1:], all=True):
+            links[kind].add(pk)
+    return links
 
 
 class CustomUserViewSet(DjoserUserViewSet):
+    replica_actions = ('list', 'retrieve', 'subscriptions')
     queryset = User.objects.all()
+    keyset_ordering = ('-id',)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            queryset = annotate_is_subscribed(queryset, self.request.user)
+        return queryset
 
     def get_permissions(self):
         if self.action == 'me':
@@ -141,6 +371,17 @@ class CustomUserViewSet(DjoserUserViewSet):
         context['user'] = self.request.user
         return context
 
+    def get_subscriptions_queryset(self, queryset):
+        recipes = Recipe.objects.only(
+            'id', 'name', 'image', 'image_variants', 'cooking_time', 'author')
+        recipes_limit = self.request.query_params.get('recipes_limit')
+        if recipes_limit and recipes_limit.isdigit():
+            recipes = recipes[:int(recipes_limit)]
+        return annotate_is_subscribed(
+            queryset, self.request.user
+        ).order_by('-id').prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='limited_recipes'))
+
     @action(detail=True, methods=['post', 'delete'], url_path='subscribe',
             permission_classes=[IsAuthenticated])
     def subscribe(self, request, *args, **pk):
@@ -158,6 +399,8 @@ class CustomUserViewSet(DjoserUserViewSet):
 
             Subscription.objects.create(subscriber=request.user,
                                         subscribed_to=target_user)
+            target_user = self.get_subscriptions_queryset(
+                User.objects.filter(pk=target_user.pk)).get()
             serializer = UserSubscriptionSerializer(
                 target_user, context={'request': request})
             return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -180,8 +423,8 @@ class CustomUserViewSet(DjoserUserViewSet):
     @action(detail=False, methods=['get'], url_path='subscriptions',
             permission_classes=[IsAuthenticated])
     def subscriptions(self, request):
-        following_users = User.objects.filter(
-            followers__subscriber=request.user)
+        following_users = self.get_subscriptions_queryset(
+            User.objects.filter(followers__subscriber=request.user))
 
         page = self.paginate_queryset(following_users)
         if page is not None:
@@ -191,3 +434,59 @@ class CustomUserViewSet(DjoserUserViewSet):
         serializer = UserSubscriptionSerializer(
             following_users, many=True, context={'request': request})
         return Response(serializer.data)
+
+    @action(detail=False, methods=['get'], url_path='me/state',
+            permission_classes=[IsAuthenticated])
+    def state(self, request):
+        """Флаги пользователя для рецептов и авторов со страницы.
+
+        Без параметров возвращает полные отсортированные списки ID
+        избранного, корзины и подписок. Ответ зависит только от версий
+        этих списков, поэтому повторный запрос с ETag не трогает базу.
+        """
+        user = request.user
+        etag = quote_etag(get_user_state(user))
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+
+        params = request.query_params
+        if 'recipes' in params or 'authors' in params:
+            recipe_ids = parse_ids(params.get('recipes', ''), 'recipes')
+            author_ids = parse_ids(params.get('authors', ''), 'authors')
+            links = get_user_links(user, recipe_ids, author_ids)
+            data = {
+                'recipes': {
+                    pk: {
+                        'is_favorited': pk in links['favorites'],
+                        'is_in_shopping_cart': pk in links['shopping_cart'],
+                    }
+                    for pk in sorted(recipe_ids)
+                },
+                'authors': {
+                    pk: {'is_subscribed': pk in links['subscriptions']}
+                    for pk in sorted(author_ids)
+                },
+            }
+        else:
+            data = {
+                kind: sorted(ids)
+                for kind, ids in get_user_links(user).items()
+            }
+        response = Response(data)
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+
+class MetricsView(APIView):
+    """Метрики процесса в текстовом формате Prometheus."""
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return HttpResponse(
+            registry.render(),
+            content_type='text/plain; version=0.0.4; charset=utf-8',
+        )
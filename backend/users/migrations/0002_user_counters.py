@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:56
+
+from django.db import migrations, models
+
+from recipe.expressions import count_related
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    Recipe = apps.get_model('recipe', 'Recipe')
+    Subscription = apps.get_model('recipe', 'Subscription')
+    User.objects.update(
+        followers_count=count_related(Subscription, 'subscribed_to'),
+        recipes_count=count_related(Recipe, 'author'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+        ('recipe', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Подписчики'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='recipes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Рецепты'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='cart_version',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Версия списка покупок'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='favorites_version',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Версия избранного'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='subscriptions_version',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Версия подписок'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата изменения'),
+        ),
+    ]
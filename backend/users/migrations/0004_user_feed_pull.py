@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_user_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='feed_pull',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Лента по запросу'),
+        ),
+    ]
@@ -32,6 +32,28 @@ class User(AbstractUser):
     bio = models.TextField(
         'Био', blank=True, null=True
     )
+    followers_count = models.PositiveIntegerField(
+        'Подписчики', default=0, editable=False
+    )
+    recipes_count = models.PositiveIntegerField(
+        'Рецепты', default=0, editable=False
+    )
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
+    # Версии списков пользователя для ETag: растут при каждом изменении.
+    favorites_version = models.PositiveIntegerField(
+        'Версия избранного', default=0, editable=False
+    )
+    cart_version = models.PositiveIntegerField(
+        'Версия списка покупок', default=0, editable=False
+    )
+    subscriptions_version = models.PositiveIntegerField(
+        'Версия подписок', default=0, editable=False
+    )
+    # Рецепты популярного автора не рассылаются по лентам, а читаются
+    # при запросе ленты. Флаг не снимается, чтобы рецепты не выпадали.
+    feed_pull = models.BooleanField(
+        'Лента по запросу', default=False, editable=False
+    )
 
     @property
     def is_admin(self):